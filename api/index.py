@@ -1,185 +1,822 @@
 # Save as: api/index.py
 
-from fastapi import FastAPI
-from fastapi.responses import HTMLResponse, JSONResponse
-from datetime import datetime
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
+from datetime import datetime, date, timedelta
 import pytz
-import urllib.request
 import urllib.parse
+import importlib
+import bisect
 import json
+import re
+import sys
 import ssl
 import gzip
+import hashlib
+import hmac
+import zlib
+import os
+import time
+import mmap
+import pickle
+import struct
+import tempfile
+import threading
+import asyncio
+import random
+import queue
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager, asynccontextmanager
+try: import fcntl
+except ImportError: fcntl = None
+try: import orjson
+except ImportError: orjson = None
+try: import brotli
+except ImportError: brotli = None
 
-app = FastAPI()
+# ═══════════════════════════════════════════════
+# STARTUP
+# ═══════════════════════════════════════════════
+# Serverless pays module import on every cold start, so heavy modules load on
+# first use. ORB_EAGER_IMPORTS=1 (or background ingestion) warms everything in
+# the lifespan instead, for long-running servers that want it paid upfront.
+EAGER_IMPORTS = os.environ.get("ORB_EAGER_IMPORTS", "0") == "1"
+
+class LazyModule:
+    def __init__(self, name): self._name = name; self._mod = None
+    def __getattr__(self, attr):
+        if self._mod is None: self._mod = importlib.import_module(self._name)
+        return getattr(self._mod, attr)
+
+np = LazyModule("numpy")
+urlrequest = LazyModule("urllib.request")
+sqlite3 = LazyModule("sqlite3")
+httpx = LazyModule("httpx")
+
+def warmup():
+    candle_dtype(); ssl_context(); page(); urlrequest.Request; httpx.AsyncClient
+
+@asynccontextmanager
+async def lifespan(app):
+    if EAGER_IMPORTS or INGEST_MODE: warmup()
+    ALERTS.start()
+    tasks = start_ingestion() if INGEST_MODE else []
+    yield
+    for t in tasks: t.cancel()
+    stop_shards()
+    await ALERTS.close()
+    await close_http_pools()
+    await asyncio.to_thread(SIGNALS.close)
+
+app = FastAPI(lifespan=lifespan)
 
 # ═══════════════════════════════════════════════
 # CONFIGURATION
 # ═══════════════════════════════════════════════
-SCRAPER_URL = "https://tradingview-scraper-production.up.railway.app"
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRAPER_URL = os.environ.get("SCRAPER_URL", "https://tradingview-scraper-production.up.railway.app")
 TZ = pytz.timezone("Africa/Gaborone")
 ET = pytz.timezone("US/Eastern")
 
-CONFIGS = {
-    "NAS100": {
-        "symbol": "OANDA:NAS100USD",
-        "max_range": 80, "max_fvg": None, "max_speed": 30, "weekend": False,
-        "range_start": 930, "range_end": 944, "post_range_start": 945,
-        "session_open": 930, "session_close": 1600, "session_tz": "US/Eastern",
-        "range": [(30,45,3),(0,30,1),(45,60,1),(60,80,0)],
-        "fvg": [(15,9999,2),(0,3,2),(7,15,1),(3,7,0)],
-        "speed": [(0,10,3),(10,20,2),(20,30,1)],
-        "best_day": ("Tuesday",3), "good_days": [("Thursday",1)],
-        "worst_day": ("Wednesday",-2), "bias": ("LONG",1),
-        "windows": None, "min_score": 5,
-    },
-    "BTCUSD": {
-        "symbol": "BITSTAMP:BTCUSD",
-        "max_range": 750, "max_fvg": 200, "max_speed": None, "weekend": True,
-        "range_start": 0, "range_end": 14, "post_range_start": 15,
-        "session_open": 0, "session_close": 2359, "session_tz": "UTC",
-        "range": [(350,500,3),(200,350,2),(0,200,1),(500,750,0)],
-        "fvg": [(25,50,3),(0,25,2),(50,100,0),(100,200,0)],
-        "speed": [(0,10,3),(10,20,2),(20,30,1),(30,60,0)],
-        "best_day": ("Sunday",3), "good_days": [("Saturday",2),("Tuesday",2),("Thursday",1)],
-        "worst_day": ("Friday",-2), "bias": None,
-        "windows": None, "min_score": 5,
-    },
-    "GOLD": {
-        "symbol": "OANDA:XAUUSD",
-        "max_range": None, "max_fvg": None, "max_speed": None, "weekend": False,
-        "range_start": 930, "range_end": 944, "post_range_start": 945,
-        "session_open": 930, "session_close": 1600, "session_tz": "US/Eastern",
-        "range": [(0,5,3),(5,10,2),(10,15,2),(25,9999,1),(15,25,0)],
-        "fvg": [(1,3,2),(0,1,1),(5,10,1),(3,5,0),(10,9999,0)],
-        "speed": [(0,10,3),(10,20,2),(20,30,1),(30,60,0)],
-        "best_day": ("Friday",3), "good_days": [("Tuesday",3),("Wednesday",1)],
-        "worst_day": ("Monday",-2), "bias": None,
-        "windows": {
-            "08:00 ET": {"start":800,"end":859,"score":2,"wr":"69.4%"},
-            "09:00 ET": {"start":900,"end":959,"score":3,"wr":"73%+"},
-            "13:00 ET": {"start":1300,"end":1359,"score":3,"wr":"73%+"},
-            "14:30 ET": {"start":1430,"end":1529,"score":2,"wr":"71.4%"},
-            "16:00 ET": {"start":1600,"end":1659,"score":1,"wr":"65.9%"},
-        },
-        "min_score": 7,
-    }
-}
+# Asset registry: assets.json (ORB_ASSETS) holds session templates, scoring profiles
+# and the asset list. Each asset names one of each and may override any of their
+# keys; CONFIGS is the merged view, one flat dict per asset. Hundreds of assets
+# share a handful of templates and profiles, and everything derived from those
+# (windows, calendars) is compiled once per template/profile, not per asset.
+ASSETS_PATH = os.environ.get("ORB_ASSETS", os.path.join(ROOT, "assets.json"))
+
+def load_assets(path=ASSETS_PATH):
+    with open(path) as f: spec = json.load(f)
+    configs = {}
+    for asset, a in spec["assets"].items():
+        if a.get("session") not in spec["sessions"]: raise ValueError(f"{asset}: unknown session template {a.get('session')!r}")
+        if a.get("profile") not in spec["profiles"]: raise ValueError(f"{asset}: unknown scoring profile {a.get('profile')!r}")
+        configs[asset] = {**spec["sessions"][a["session"]], **spec["profiles"][a["profile"]], **a}
+    return configs
+
+CONFIGS = load_assets()
+
+# Compiled once at import instead of per call, and shared by every asset with the
+# same inputs.
+SESSION_FIELDS = ("session_tz","session_open","session_close","range_start","range_end","weekend","calendar")
+
+def _compile(configs):
+    tzs, windows, keys = {}, {}, {}
+    for asset, c in configs.items():
+        tzs[asset] = pytz.timezone(c["session_tz"])
+        wkey = json.dumps(c.get("windows"), sort_keys=True)
+        if wkey not in windows:
+            windows[wkey] = sorted(c["windows"].items(), key=lambda x: x[1]["start"]) if c.get("windows") else []
+        keys[asset] = (tuple(c[k] for k in SESSION_FIELDS), wkey)
+    return tzs, {a: windows[k[1]] for a, k in keys.items()}, keys
+
+# CALENDAR_KEY: assets with equal session fields and windows share SessionCalendars
+SESSION_TZ, SORTED_WINDOWS, CALENDAR_KEY = _compile(CONFIGS)
+
+# ═══════════════════════════════════════════════
+# METRICS
+# ═══════════════════════════════════════════════
+METRICS = {}
+_metrics_lock = threading.Lock()
+
+def metric_inc(name, n=1):
+    with _metrics_lock: METRICS[name] = METRICS.get(name, 0) + n
+
+def metric_set(name, value):
+    METRICS[name] = value
+
+def metric_time(name, seconds):
+    ms = seconds * 1000
+    with _metrics_lock:
+        m = METRICS.setdefault(name, {"count":0,"total_ms":0.0,"last_ms":0.0,"max_ms":0.0})
+        m["count"] += 1; m["total_ms"] = round(m["total_ms"] + ms, 3)
+        m["last_ms"] = round(ms, 3); m["max_ms"] = round(max(m["max_ms"], ms), 3)
 
 # ═══════════════════════════════════════════════
 # CACHE
 # ═══════════════════════════════════════════════
-cache = {}
 CACHE_TTL = 30
+CACHE_BACKEND = os.environ.get("ORB_CACHE_BACKEND", "memory")
+CACHE_DIR = os.environ.get("ORB_CACHE_DIR")
+
+# Per-process cache: each worker scrapes on its own.
+class MemoryCache:
+    def __init__(self):
+        self.data = {}; self.locks = {}; self.guard = threading.Lock()
+
+    def get(self, key, ttl=CACHE_TTL):
+        if key in self.data:
+            data, ts = self.data[key]
+            if (time.time() - ts) < ttl: return data
+        return None
+
+    def set(self, key, data):
+        self.data[key] = (data, time.time())
+
+    @contextmanager
+    def lock(self, key):
+        with self.guard: lk = self.locks.setdefault(key, threading.Lock())
+        with lk: yield
+
+# Shared by every worker on the host, one file per key:
+# header (written-at, pickle length, buffer count) | pickle protocol 5 stream |
+# out-of-band buffer lengths | 64-byte aligned buffers.
+# Reads mmap the file so arrays come back as zero-copy views over the page cache;
+# writes are atomic (tmp + rename); lock() is single-flight across processes (flock).
+class FileCache:
+    HDR = struct.Struct("<dQQ")
+    ALIGN = 64
+
+    def __init__(self, root=None):
+        self.root = root or os.path.join(tempfile.gettempdir(), "orb-cache")
+        os.makedirs(self.root, exist_ok=True)
+        self.local = {}; self.locks = MemoryCache()
+
+    def path(self, key, ext="bin"):
+        return os.path.join(self.root, f"{urllib.parse.quote(str(key), safe='')}.{ext}")
+
+    def get(self, key, ttl=CACHE_TTL):
+        p = self.path(key)
+        try: st = os.stat(p)
+        except FileNotFoundError: return None
+        sig = (st.st_ino, st.st_mtime_ns, st.st_size)
+        hit = self.local.get(key)
+        if hit and hit[0] == sig: data, ts = hit[1], hit[2]
+        else:
+            try: data, ts = self._load(p)
+            except (OSError, ValueError, EOFError, pickle.UnpicklingError): return None
+            self.local[key] = (sig, data, ts)
+        return data if (time.time() - ts) < ttl else None
+
+    def _load(self, p):
+        with open(p, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mm)
+        ts, plen, nbuf = self.HDR.unpack_from(view, 0)
+        off = self.HDR.size; body = view[off:off+plen]; off += plen
+        lens = struct.unpack_from(f"<{nbuf}Q", view, off); off += 8*nbuf
+        bufs = []
+        for n in lens:
+            off = -(-off // self.ALIGN) * self.ALIGN
+            bufs.append(view[off:off+n]); off += n
+        return pickle.loads(body, buffers=bufs), ts
+
+    def set(self, key, data):
+        bufs = []
+        body = pickle.dumps(data, protocol=5, buffer_callback=bufs.append)
+        raws = [b.raw() for b in bufs]
+        out = bytearray(self.HDR.pack(time.time(), len(body), len(raws)))
+        out += body; out += struct.pack(f"<{len(raws)}Q", *(r.nbytes for r in raws))
+        for r in raws:
+            out += bytes(-len(out) % self.ALIGN); out += r
+        p = self.path(key); tmp = f"{p}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f: f.write(out)
+        os.replace(tmp, p)
+
+    @contextmanager
+    def lock(self, key):
+        with self.locks.lock(key), file_lock(self.path(key, "lock")): yield
+
+@contextmanager
+def file_lock(path):
+    if fcntl is None: yield; return
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try: yield
+        finally: fcntl.flock(f, fcntl.LOCK_UN)
+
+# FileCache on tmpfs. /dev/shm is where shm_open (and multiprocessing.shared_memory)
+# keeps its segments, so entries live in shared memory and never touch disk.
+class ShmCache(FileCache):
+    def __init__(self, root=None):
+        shm = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+        super().__init__(root or os.path.join(shm, "orb-cache"))
+
+CACHE_BACKENDS = {"memory": MemoryCache, "file": FileCache, "shm": ShmCache}
+CACHE = MemoryCache() if CACHE_BACKEND == "memory" else CACHE_BACKENDS[CACHE_BACKEND](CACHE_DIR)
 
 def get_cached(key):
-    if key in cache:
-        data, ts = cache[key]
-        if (datetime.now().timestamp() - ts) < CACHE_TTL:
-            return data
-    return None
+    return CACHE.get(key)
 
 def set_cached(key, data):
-    cache[key] = (data, datetime.now().timestamp())
+    CACHE.set(key, data)
 
 # ═══════════════════════════════════════════════
 # HTTP HELPER
 # ═══════════════════════════════════════════════
-def http_get(url, headers=None):
-    try:
+_ssl_ctx = None
+
+def ssl_context():
+    global _ssl_ctx
+    if _ssl_ctx is None:
         ctx = ssl.create_default_context()
         ctx.check_hostname = False
         ctx.verify_mode = ssl.CERT_NONE
+        _ssl_ctx = ctx
+    return _ssl_ctx
+
+def http_get(url, headers=None):
+    breaker = breaker_for(url)
+    if not breaker.allow():
+        raise CircuitOpen(f"HTTP error [{url[:80]}]: circuit open for {breaker.host} ({breaker.retry_in()}s)")
+    if not upstream_wait(): raise Exception(f"HTTP error [{url[:80]}]: upstream budget exhausted")
+    try:
         h = {"User-Agent":"Mozilla/5.0","Accept":"application/json"}
         if headers: h.update(headers)
-        req = urllib.request.Request(url, headers=h)
-        resp = urllib.request.urlopen(req, timeout=15, context=ctx)
+        req = urlrequest.Request(url, headers=h)
+        resp = urlrequest.urlopen(req, timeout=15, context=ssl_context())
         raw = resp.read()
+    except urlrequest.HTTPError as e:
+        # 4xx means the host is up and this endpoint variant is not supported
+        if e.code < 500: breaker.success()
+        else: breaker.failure()
+        raise Exception(f"HTTP error [{url[:80]}]: {str(e)}")
+    except Exception as e:
+        breaker.failure()
+        raise Exception(f"HTTP error [{url[:80]}]: {str(e)}")
+    breaker.success()
+    try:
         if raw[:2] == b'\x1f\x8b': raw = gzip.decompress(raw)
         return json.loads(raw.decode('utf-8'))
     except Exception as e:
         raise Exception(f"HTTP error [{url[:80]}]: {str(e)}")
 
+# ═══════════════════════════════════════════════
+# CIRCUIT BREAKER
+# ═══════════════════════════════════════════════
+# Per-host CLOSED -> OPEN after BREAKER_THRESHOLD consecutive failures. While OPEN
+# calls fail fast; after a jittered exponential backoff one probe is let through
+# (HALF_OPEN): success closes the circuit, failure reopens it with a longer delay.
+BREAKER_THRESHOLD = 3
+BREAKER_BASE = 5
+BREAKER_MAX = 300
+HEDGE_AFTER = float(os.environ.get("ORB_HEDGE_AFTER", 0))
+
+class CircuitOpen(Exception): pass
+
+class CircuitBreaker:
+    def __init__(self, host, threshold=BREAKER_THRESHOLD, base=BREAKER_BASE, cap=BREAKER_MAX):
+        self.host = host; self.threshold = threshold; self.base = base; self.cap = cap
+        self.state = "CLOSED"; self.failures = 0; self.trips = 0; self.open_until = 0; self.probing = False
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.state == "CLOSED": return True
+            if self.state == "OPEN" and time.time() >= self.open_until:
+                self.state = "HALF_OPEN"; self.probing = False
+            if self.state == "HALF_OPEN" and not self.probing:
+                self.probing = True; return True
+            return False
+
+    def success(self):
+        with self.lock:
+            self.state = "CLOSED"; self.failures = 0; self.trips = 0; self.probing = False
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1; self.probing = False
+            if self.state == "HALF_OPEN" or self.failures >= self.threshold:
+                self.trips += 1; self.state = "OPEN"
+                delay = min(self.cap, self.base * 2 ** (self.trips - 1))
+                self.open_until = time.time() + random.uniform(delay / 2, delay)
+
+    def retry_in(self):
+        return max(0, round(self.open_until - time.time(), 1))
+
+    def info(self):
+        return {"state":self.state,"failures":self.failures,"trips":self.trips,
+            "retry_in":self.retry_in() if self.state == "OPEN" else 0}
+
+BREAKERS = {}
+_breakers_lock = threading.Lock()
+
+def breaker_for(url):
+    host = urllib.parse.urlsplit(url).netloc
+    with _breakers_lock:
+        if host not in BREAKERS: BREAKERS[host] = CircuitBreaker(host)
+        return BREAKERS[host]
+
+HEDGE_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="orb-hedge")
+
+def get_first(urls):
+    # Sequential fallback by default. With ORB_HEDGE_AFTER set, the next endpoint
+    # variant also starts when the current ones have been silent that long; the
+    # first non-empty answer wins and the losers finish in the background.
+    if not HEDGE_AFTER:
+        last_err = None
+        for url in urls:
+            try:
+                data = http_get(url)
+                if data: return data, None
+            except CircuitOpen as e: return None, str(e)
+            except Exception as e: last_err = str(e)
+        return None, last_err
+    pending = set(); last_err = None; it = iter(urls)
+    pending.add(HEDGE_POOL.submit(http_get, next(it)))
+    while pending:
+        done, pending = wait(pending, timeout=HEDGE_AFTER, return_when=FIRST_COMPLETED)
+        for f in done:
+            try:
+                data = f.result()
+                if data: return data, None
+            except Exception as e: last_err = str(e)
+        nxt = next(it, None)
+        if nxt: pending.add(HEDGE_POOL.submit(http_get, nxt))
+    return None, last_err
+
+# ═══════════════════════════════════════════════
+# ASYNC HTTP
+# ═══════════════════════════════════════════════
+# httpx for the async handlers, so a request waiting on the scraper holds a
+# coroutine instead of a threadpool thread. One AsyncClient per event loop (the
+# app's, or a shard process's own) pools keep-alive connections; it follows
+# redirects, honours proxy environment variables and decodes gzip/brotli bodies,
+# as urllib does for http_get. ahttp_get keeps http_get's breaker accounting.
+HTTP_TIMEOUT = 15
+HTTP_POOL_SIZE = 8
+_http_clients = {}
+
+def http_client():
+    loop = asyncio.get_running_loop(); client = _http_clients.get(loop)
+    if client is None or client.is_closed:
+        for old in [l for l in _http_clients if l.is_closed()]: del _http_clients[old]
+        client = _http_clients[loop] = httpx.AsyncClient(
+            headers={"User-Agent":"Mozilla/5.0","Accept":"application/json"}, verify=ssl_context(),
+            follow_redirects=True, trust_env=True, timeout=HTTP_TIMEOUT,
+            limits=httpx.Limits(max_connections=None, max_keepalive_connections=HTTP_POOL_SIZE))
+    return client
+
+async def ahttp_request(method, url, body=None, headers=None, timeout=HTTP_TIMEOUT):
+    # -> (status, headers, body bytes) after redirects; transport errors and timeouts raise
+    resp = await asyncio.wait_for(http_client().request(method, url, content=body, headers=headers, timeout=timeout), timeout)
+    return resp.status_code, resp.headers, resp.content
+
+async def ahttp_get(url, headers=None):
+    breaker = breaker_for(url)
+    if not breaker.allow():
+        raise CircuitOpen(f"HTTP error [{url[:80]}]: circuit open for {breaker.host} ({breaker.retry_in()}s)")
+    if not await upstream_acquire(): raise Exception(f"HTTP error [{url[:80]}]: upstream budget exhausted")
+    try: status, _, raw = await ahttp_request("GET", url, headers=headers)
+    except Exception as e:
+        breaker.failure()
+        raise Exception(f"HTTP error [{url[:80]}]: {str(e) or type(e).__name__}")
+    if status >= 300:
+        # 3xx left after following redirects and 4xx mean the host is up and this endpoint variant is not supported
+        if status < 500: breaker.success()
+        else: breaker.failure()
+        raise Exception(f"HTTP error [{url[:80]}]: HTTP Error {status}")
+    breaker.success()
+    try:
+        if raw[:2] == b'\x1f\x8b': raw = gzip.decompress(raw)
+        return await asyncio.to_thread(json.loads, raw)
+    except Exception as e:
+        raise Exception(f"HTTP error [{url[:80]}]: {str(e)}")
+
+def _discard(task):
+    # hedged losers finish in the background; retrieve their result so errors aren't logged
+    if not task.cancelled(): task.exception()
+
+async def aget_first(urls):
+    # get_first on the event loop: sequential fallback, or hedged after HEDGE_AFTER
+    if not HEDGE_AFTER:
+        last_err = None
+        for url in urls:
+            try:
+                data = await ahttp_get(url)
+                if data: return data, None
+            except CircuitOpen as e: return None, str(e)
+            except Exception as e: last_err = str(e)
+        return None, last_err
+    pending = set(); last_err = None; it = iter(urls)
+    pending.add(asyncio.ensure_future(ahttp_get(next(it))))
+    while pending:
+        done, pending = await asyncio.wait(pending, timeout=HEDGE_AFTER, return_when=asyncio.FIRST_COMPLETED)
+        for f in done:
+            try:
+                data = f.result()
+                if data:
+                    for t in pending: t.add_done_callback(_discard)
+                    return data, None
+            except Exception as e: last_err = str(e)
+        nxt = next(it, None)
+        if nxt: pending.add(asyncio.ensure_future(ahttp_get(nxt)))
+    return None, last_err
+
+async def close_http_pools():
+    client = _http_clients.pop(asyncio.get_running_loop(), None)
+    if client: await client.aclose()
+
+# ═══════════════════════════════════════════════
+# RATE LIMITING
+# ═══════════════════════════════════════════════
+class TokenBucket:
+    def __init__(self, rate, burst=None):
+        self.rate = rate; self.capacity = burst or max(1.0, rate); self.tokens = self.capacity
+        self.stamp = time.monotonic(); self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate); self.stamp = now
+
+    def take(self, n=1):
+        with self.lock:
+            self._refill()
+            if self.tokens >= n: self.tokens -= n; return True
+            return False
+
+    def give(self, n=1):
+        # hands back tokens taken but not spent
+        with self.lock: self._refill(); self.tokens = min(self.capacity, self.tokens + n)
+
+    def delay(self, n=1):
+        with self.lock:
+            self._refill()
+            return max(0.0, (n - self.tokens) / self.rate) if self.rate else float("inf")
+
+    def wait(self, n=1, deadline=None):
+        # False when the tokens would only come after deadline (epoch)
+        while not self.take(n):
+            d = max(0.001, self.delay(n))
+            if deadline is not None and time.time() + d > deadline: return False
+            time.sleep(d)
+        return True
+
+    async def acquire(self, n=1, deadline=None):
+        # wait on the loop for n tokens; False when they would only come after deadline (epoch)
+        while not self.take(n):
+            d = max(0.001, self.delay(n))
+            if deadline is not None and time.time() + d > deadline: return False
+            await asyncio.sleep(d)
+        return True
+
+# ═══════════════════════════════════════════════
+# CANDLES
+# ═══════════════════════════════════════════════
+# One structured array per series: epoch seconds + OHLC, 40 bytes a bar. The
+# display fields of the old per-bar dicts (time, time_et, time_hhmm_et, date_et)
+# are derived from the timestamps on demand and memoized per series.
+_candle_dtype = None
+PRICE_FIELDS = ("open","high","low","close")
+
+def candle_dtype():
+    global _candle_dtype
+    if _candle_dtype is None:
+        _candle_dtype = np.dtype([("t","<i8"),("open","<f8"),("high","<f8"),("low","<f8"),("close","<f8")])
+    return _candle_dtype
+
+def local_seconds(t, tz):
+    # wall-clock seconds in tz; offsets only change on hour boundaries
+    hours, inv = np.unique(t // 3600, return_inverse=True)
+    offs = np.array([datetime.fromtimestamp(int(h)*3600, tz).utcoffset().total_seconds() for h in hours], dtype=np.int64)
+    return t + offs[inv]
+
+class Candles:
+    __slots__ = ("_rec","_memo")
+
+    def __init__(self, rec=None):
+        self._rec = rec; self._memo = {}
+
+    @property
+    def rec(self):
+        if self._rec is None: self._rec = np.empty(0, candle_dtype())
+        return self._rec
+
+    @classmethod
+    def from_rows(cls, rows):
+        return cls(np.array(rows, dtype=candle_dtype()))
+
+    def __reduce__(self): return (Candles, (self.rec,))
+    def __len__(self): return 0 if self._rec is None else len(self._rec)
+    def __iter__(self): return (Candle(self, i) for i in range(len(self.rec)))
+
+    def __getitem__(self, i):
+        if isinstance(i, slice): return Candles(self.rec[i])
+        if i < 0: i += len(self.rec)
+        if not 0 <= i < len(self.rec): raise IndexError(i)
+        return Candle(self, i)
+
+    @property
+    def t(self): return self.rec["t"]
+    @property
+    def open(self): return self.rec["open"]
+    @property
+    def high(self): return self.rec["high"]
+    @property
+    def low(self): return self.rec["low"]
+    @property
+    def close(self): return self.rec["close"]
+
+    def _derived(self, key, fn):
+        if key not in self._memo: self._memo[key] = fn()
+        return self._memo[key]
+
+    def et(self): return self._derived("et", lambda: local_seconds(self.rec["t"], ET))
+    def cat(self): return self._derived("cat", lambda: local_seconds(self.rec["t"], TZ))
+    def hhmm_et(self): return self._derived("hhmm_et", lambda: (self.et() // 3600 % 24) * 100 + self.et() // 60 % 60)
+    def day_et(self): return self._derived("day_et", lambda: self.et() // 86400)
+
+    def session(self, date_str):
+        day = (datetime.strptime(date_str, "%Y-%m-%d") - datetime(1970,1,1)).days
+        return Candles(self.rec[self.day_et() == day])
+
+    def between(self, lo, hi=2359):
+        hm = self.hhmm_et()
+        return Candles(self.rec[(hm >= lo) & (hm <= hi)])
+
+    def to_dicts(self): return [c.to_dict() for c in self]
+
+EMPTY_CANDLES = Candles()
+
+# Dict-compatible view of one bar, for code that indexes c['high'] or c.get('time_et').
+class Candle:
+    __slots__ = ("series","i")
+    KEYS = ("time","time_et","time_hhmm_et","date_et") + PRICE_FIELDS
+
+    def __init__(self, series, i): self.series = series; self.i = i
+
+    def __getitem__(self, k):
+        s = self.series; i = self.i
+        if k in PRICE_FIELDS: return float(s.rec[k][i])
+        if k == "time_hhmm_et": return int(s.hhmm_et()[i])
+        if k == "time_et": return hhmm_str(s.et()[i])
+        if k == "time": return hhmm_str(s.cat()[i])
+        if k == "date_et": return datetime.fromtimestamp(int(s.et()[i]), pytz.UTC).strftime("%Y-%m-%d")
+        if k == "t": return int(s.rec["t"][i])
+        raise KeyError(k)
+
+    def get(self, k, default=None):
+        try: return self[k]
+        except KeyError: return default
+
+    def keys(self): return self.KEYS
+    def to_dict(self): return {k: self[k] for k in self.KEYS}
+    def __repr__(self): return f"Candle({self.to_dict()})"
+
+def hhmm_str(local_s):
+    m = int(local_s) // 60 % 1440
+    return f"{m//60:02d}:{m%60:02d}"
+
+# ═══════════════════════════════════════════════
+# CANDLE STORE
+# ═══════════════════════════════════════════════
+# <root>/<symbol>/<interval>/<YYYY-MM>.npy: monthly partitions of candle records,
+# sorted by time and unique per timestamp (a rewrite of a bar replaces it).
+# Partitions are read memory-mapped; writes merge under a per-partition flock
+# and land atomically via tmp + rename.
+STORE_DIR = os.environ.get("ORB_STORE_DIR", os.path.join(ROOT, "data", "candles"))
+
+class CandleStore:
+    def __init__(self, root=None):
+        self.root = root or STORE_DIR
+
+    def dir(self, symbol, interval):
+        return os.path.join(self.root, urllib.parse.quote(symbol, safe=""), str(interval))
+
+    def months(self, symbol, interval):
+        d = self.dir(symbol, interval)
+        return sorted(f[:-4] for f in os.listdir(d) if f.endswith(".npy")) if os.path.isdir(d) else []
+
+    def _load(self, path, mmap=True):
+        try: return np.load(path, mmap_mode="r" if mmap else None)
+        except FileNotFoundError: return None
+
+    def write(self, symbol, interval, candles):
+        # -> number of bars that were not in the store yet
+        rec = candles.rec if isinstance(candles, Candles) else candles
+        if not len(rec): return 0
+        d = self.dir(symbol, interval); os.makedirs(d, exist_ok=True)
+        months = rec["t"].astype("datetime64[s]").astype("datetime64[M]")
+        added = 0
+        for m in np.unique(months):
+            part = rec[months == m]; path = os.path.join(d, f"{m}.npy")
+            with file_lock(path + ".lock"):
+                old = self._load(path, mmap=False)
+                before = 0 if old is None else len(old)
+                merged = part if old is None else np.concatenate([old, part])
+                # keep the last write of each timestamp
+                _, last = np.unique(merged["t"][::-1], return_index=True)
+                merged = merged[len(merged) - 1 - last]
+                tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp, "wb") as f: np.save(f, merged)
+                os.replace(tmp, path)
+            added += len(merged) - before
+        return added
+
+    def read(self, symbol, interval, start=None, end=None):
+        # bars with start <= t < end (epoch seconds)
+        lo = None if start is None else str(np.datetime64(int(start), "s").astype("datetime64[M]"))
+        hi = None if end is None else str(np.datetime64(int(end), "s").astype("datetime64[M]"))
+        parts = []
+        for m in self.months(symbol, interval):
+            if (lo and m < lo) or (hi and m > hi): continue
+            arr = self._load(os.path.join(self.dir(symbol, interval), f"{m}.npy"))
+            if arr is not None: parts.append(arr)
+        if not parts: return Candles()
+        rec = parts[0] if len(parts) == 1 else np.concatenate(parts)
+        mask = np.ones(len(rec), bool)
+        if start is not None: mask &= rec["t"] >= start
+        if end is not None: mask &= rec["t"] < end
+        return Candles(rec if mask.all() else rec[mask])
+
+    def span(self, symbol, interval):
+        months = self.months(symbol, interval)
+        if not months: return None, None
+        d = self.dir(symbol, interval)
+        first = self._load(os.path.join(d, f"{months[0]}.npy")); last = self._load(os.path.join(d, f"{months[-1]}.npy"))
+        return int(first["t"][0]), int(last["t"][-1])
+
+STORE = CandleStore()
+
+# ORB_SHARDS > 1 partitions assets across shard processes (see BACKGROUND INGESTION)
+# by a stable hash of the name. Each shard gets its own store under <root>/shard-<k>,
+# so backfills and shard workers never contend on the same partition locks.
+SHARDS = max(1, int(os.environ.get("ORB_SHARDS", 1)))
+_shard_stores = {}
+
+def shard_of(asset):
+    return zlib.crc32(asset.encode()) % SHARDS
+
+def shard_assets(k):
+    return [a for a in CONFIGS if shard_of(a) == k]
+
+def store_for(asset, store=None):
+    store = store or STORE
+    if SHARDS == 1: return store
+    path = os.path.join(store.root, f"shard-{shard_of(asset)}")
+    if path not in _shard_stores: _shard_stores[path] = CandleStore(path)
+    return _shard_stores[path]
+
 # ═══════════════════════════════════════════════
 # SCRAPER
 # ═══════════════════════════════════════════════
-def fetch_candles(symbol, interval="1", limit=500):
+# One upstream budget per process: ORB_UPSTREAM_RATE scraper calls/s, split evenly
+# across shards (0 = unlimited). Every scraper request takes a token in http_get /
+# ahttp_get, whoever makes it: on-demand scans, scraper-test, health, ingestion.
+# A request that can't get one within HTTP_TIMEOUT fails like any other upstream
+# error. Ingestion reserves a refresh's CALLS_PER_REFRESH calls up front
+# (RefreshScheduler.admit) and runs it with UPSTREAM_PREPAID holding that allowance:
+# those calls are not charged twice, anything past them (fallback endpoints, hedges)
+# is charged as usual, and what a cache hit leaves unused goes back to the bucket.
+UPSTREAM_RATE = float(os.environ.get("ORB_UPSTREAM_RATE", 0))
+CALLS_PER_REFRESH = 2
+UPSTREAM = TokenBucket(UPSTREAM_RATE / SHARDS, burst=max(CALLS_PER_REFRESH, UPSTREAM_RATE / SHARDS)) if UPSTREAM_RATE else None
+UPSTREAM_PREPAID = contextvars.ContextVar("upstream_prepaid", default=None)
+
+def upstream_prepaid():
+    # [calls left] shared by a refresh's task and the tasks/threads it spawns
+    left = UPSTREAM_PREPAID.get()
+    if not left or left[0] <= 0: return False
+    left[0] -= 1; return True
+
+def upstream_wait():
+    return UPSTREAM is None or upstream_prepaid() or UPSTREAM.wait(1, time.time() + HTTP_TIMEOUT)
+
+async def upstream_acquire():
+    return UPSTREAM is None or upstream_prepaid() or await UPSTREAM.acquire(1, time.time() + HTTP_TIMEOUT)
+
+def candle_urls(symbol, interval="1", limit=500, end=None):
+    # end: epoch seconds of the newest bar wanted, sent as the UDF-style "to" bound
     enc = urllib.parse.quote(symbol, safe='')
+    to = f"&to={int(end)}" if end is not None else ""
     endpoints = [
-        f"{SCRAPER_URL}/api/history?symbol={enc}&interval={interval}&limit={limit}",
-        f"{SCRAPER_URL}/api/history?symbol={enc}&resolution={interval}&bars_count={limit}",
-        f"{SCRAPER_URL}/api/history?symbol={enc}&resolution={interval}&countback={limit}",
-        f"{SCRAPER_URL}/api/candles?symbol={enc}&interval={interval}&limit={limit}",
-        f"{SCRAPER_URL}/api/data?symbol={enc}&interval={interval}&limit={limit}",
+        f"{SCRAPER_URL}/api/history?symbol={enc}&interval={interval}&limit={limit}{to}",
+        f"{SCRAPER_URL}/api/history?symbol={enc}&resolution={interval}&bars_count={limit}{to}",
+        f"{SCRAPER_URL}/api/history?symbol={enc}&resolution={interval}&countback={limit}{to}",
+        f"{SCRAPER_URL}/api/candles?symbol={enc}&interval={interval}&limit={limit}{to}",
+        f"{SCRAPER_URL}/api/data?symbol={enc}&interval={interval}&limit={limit}{to}",
     ]
-    data = None; last_err = None
-    for url in endpoints:
-        try:
-            data = http_get(url)
-            if data: break
-        except Exception as e:
-            last_err = str(e); continue
-    if not data: return [], f"Scraper unreachable: {last_err}"
+    return endpoints
+
+def fetch_candles(symbol, interval="1", limit=500, end=None):
+    data, last_err = get_first(candle_urls(symbol, interval, limit, end))
+    if not data: return EMPTY_CANDLES, f"Scraper unreachable: {last_err}"
     return parse_candles(data)
 
+async def afetch_candles(symbol, interval="1", limit=500, end=None):
+    data, last_err = await aget_first(candle_urls(symbol, interval, limit, end))
+    if not data: return EMPTY_CANDLES, f"Scraper unreachable: {last_err}"
+    return await asyncio.to_thread(parse_candles, data)
+
 def parse_candles(data):
     if isinstance(data, dict) and "t" in data and isinstance(data["t"], list):
         times,opens,highs,lows,closes = data.get("t",[]),data.get("o",[]),data.get("h",[]),data.get("l",[]),data.get("c",[])
-        candles = []
-        for i in range(len(times)):
-            try:
-                ts = times[i]
-                if ts > 1e12: ts = ts/1000
-                dt_utc = datetime.fromtimestamp(ts, tz=pytz.UTC)
-                dt_cat = dt_utc.astimezone(TZ); dt_et = dt_utc.astimezone(ET)
-                candles.append({"time":dt_cat.strftime("%H:%M"),"time_et":dt_et.strftime("%H:%M"),
-                    "time_hhmm_et":dt_et.hour*100+dt_et.minute,"date_et":dt_et.strftime("%Y-%m-%d"),
-                    "open":float(opens[i]),"high":float(highs[i]),"low":float(lows[i]),"close":float(closes[i])})
-            except: continue
-        return (candles, None) if candles else ([], "No candles parsed")
+        try:
+            cols = np.array([times,opens,highs,lows,closes], dtype=np.float64)
+            cols = cols[:, np.isfinite(cols).all(axis=0)]
+        except (ValueError, TypeError):
+            rows = []
+            for i in range(len(times)):
+                try: rows.append((float(times[i]),float(opens[i]),float(highs[i]),float(lows[i]),float(closes[i])))
+                except (ValueError, TypeError, IndexError): continue
+            cols = np.array(rows, dtype=np.float64).reshape(-1, 5).T
+            cols = cols[:, np.isfinite(cols).all(axis=0)]
+        ts = np.where(cols[0] > 1e12, cols[0]/1000, cols[0])
+        rec = np.empty(cols.shape[1], candle_dtype())
+        rec["t"] = ts; rec["open"],rec["high"],rec["low"],rec["close"] = cols[1],cols[2],cols[3],cols[4]
+        return (parsed(rec, len(times)), None) if len(rec) else (EMPTY_CANDLES, "No candles parsed")
     raw_list = []
     if isinstance(data, list): raw_list = data
     elif isinstance(data, dict):
         for key in ["candles","data","result","bars","ohlc","klines"]:
             if key in data and isinstance(data[key], list): raw_list = data[key]; break
-        if not raw_list: return [], f"Unknown keys: {list(data.keys())}"
-    candles = []
+        if not raw_list: return EMPTY_CANDLES, f"Unknown keys: {list(data.keys())}"
+    rows = []
     for item in raw_list:
         try:
             ts = item.get('timestamp', item.get('t', None))
             if ts and isinstance(ts, (int,float)):
                 if ts > 1e12: ts = ts/1000
-                dt_utc = datetime.fromtimestamp(ts, tz=pytz.UTC)
             else: continue
-            dt_cat = dt_utc.astimezone(TZ); dt_et = dt_utc.astimezone(ET)
             o,h,l,c = float(item.get('open',item.get('o',0))),float(item.get('high',item.get('h',0))),float(item.get('low',item.get('l',0))),float(item.get('close',item.get('c',0)))
             if o==0 and h==0 and l==0 and c==0: continue
-            candles.append({"time":dt_cat.strftime("%H:%M"),"time_et":dt_et.strftime("%H:%M"),
-                "time_hhmm_et":dt_et.hour*100+dt_et.minute,"date_et":dt_et.strftime("%Y-%m-%d"),
-                "open":o,"high":h,"low":l,"close":c})
-        except: continue
-    return (candles, None) if candles else ([], "Could not parse candles")
+            rows.append((int(ts),o,h,l,c))
+        except (ValueError, TypeError, AttributeError): continue
+    return (parsed(np.array(rows, dtype=candle_dtype()), len(raw_list)), None) if rows else (EMPTY_CANDLES, "Could not parse candles")
+
+def parsed(rec, received):
+    # rows the parser could not use are counted for check_candles, not silently lost
+    candles = Candles(rec); candles._memo["dropped"] = received - len(rec); return candles
 
 def scrape_asset(asset):
     cached = get_cached(asset)
     if cached: return cached
-    config = CONFIGS[asset]; symbol = config["symbol"]
-    result = {"asset":asset,"symbol":symbol,"status":"ERROR","candles":[],"ma50":None,"ma200":None,
-        "price":None,"price_change":None,"price_change_pct":None,"day_open":None,"error":None,
-        "source":"Railway Scraper","candle_count":0}
+    # single-flight: whoever holds the lock scrapes, the rest wait and read its result
+    with CACHE.lock(asset):
+        cached = get_cached(asset)
+        if cached: return cached
+        return _scrape_asset(asset)
+
+def _scrape_asset(asset):
+    symbol = CONFIGS[asset]["symbol"]
     try:
         c15, err15 = fetch_candles(symbol, "15", 300)
+        c1 = fetch_candles(symbol, "1", 500)[0] if len(c15) >= 50 else EMPTY_CANDLES
+    except Exception as e: return store_scrape(asset, scrape_result(asset, error=str(e)))
+    return store_scrape(asset, scrape_result(asset, c15, err15, c1))
+
+def scrape_result(asset, c15=EMPTY_CANDLES, err15=None, c1=EMPTY_CANDLES, error=None):
+    config = CONFIGS[asset]; symbol = config["symbol"]
+    result = {"asset":asset,"symbol":symbol,"status":"ERROR","candles":EMPTY_CANDLES,"ma50":None,"ma200":None,
+        "price":None,"price_change":None,"price_change_pct":None,"day_open":None,"error":error,
+        "source":"Railway Scraper","candle_count":0,"scraped_at":datetime.now(TZ).isoformat()}
+    if error: return result
+    # kept for the candle store (see BACKGROUND INGESTION)
+    result["candles15"] = c15
+    try:
         if not c15 or len(c15) < 50:
             result["error"] = f"Not enough 15m data ({len(c15) if c15 else 0}). {err15 or ''}"
-            set_cached(asset, result); return result
-        closes15 = [c['close'] for c in c15]
-        result["ma50"] = round(sum(closes15[-50:])/50, 2)
-        result["ma200"] = round(sum(closes15[-200:])/200, 2) if len(closes15)>=200 else round(sum(closes15)/len(closes15), 2)
-        c1, err1 = fetch_candles(symbol, "1", 500)
+            return result
+        closes15 = c15.close
+        result["ma50"] = round(float(closes15[-50:].mean()), 2)
+        result["ma200"] = round(float(closes15[-200:].mean()), 2)
+        if c1 and len(c1) > 0: c1, result["quality"] = check_candles(c1)
         if c1 and len(c1) > 0:
             result["candles"] = c1; result["price"] = round(c1[-1]['close'], 2)
-            session_tz = pytz.timezone(config["session_tz"])
+            session_tz = SESSION_TZ[asset]
             today_str = datetime.now(session_tz).strftime("%Y-%m-%d")
-            today_candles = [c for c in c1 if c.get("date_et")==today_str]
+            today_candles = c1.session(today_str)
             result["day_open"] = round(today_candles[0]['open'], 2) if today_candles else round(c1[0]['open'], 2)
             result["candle_count"] = len(c1); result["status"] = "OK"
         else:
@@ -190,64 +827,290 @@ def scrape_asset(asset):
             result["price_change"] = round(result["price"]-result["day_open"], 2)
             result["price_change_pct"] = round(((result["price"]-result["day_open"])/result["day_open"])*100, 3)
     except Exception as e: result["error"] = str(e)
+    return result
+
+def store_scrape(asset, result):
+    # keep the last good scrape forever; on failure serve it marked stale
+    if result["status"] == "OK": set_cached(f"{asset}:last_good", result)
+    else:
+        good = CACHE.get(f"{asset}:last_good", ttl=float("inf"))
+        if good:
+            result = {**good,"stale":True,"stale_since":good.get("scraped_at"),"error":result["error"]}
     set_cached(asset, result); return result
 
 def scrape_all():
     return {asset: scrape_asset(asset) for asset in CONFIGS}
 
+# Async twins for the handlers. Concurrent requests for an asset share one task on
+# the loop; across workers the scrape still goes through CACHE.lock, whose blocking
+# acquire runs in a thread so the loop never waits on it.
+_SCRAPES = {}
+
+async def ascrape_asset(asset):
+    cached = get_cached(asset)
+    if cached: return cached
+    task = _SCRAPES.get(asset)
+    if task is None or task.done(): task = _SCRAPES[asset] = asyncio.ensure_future(_ascrape_locked(asset))
+    return await asyncio.shield(task)
+
+async def _ascrape_locked(asset):
+    lock = CACHE.lock(asset)
+    await asyncio.to_thread(lock.__enter__)
+    try:
+        cached = get_cached(asset)
+        return cached if cached else await _ascrape_asset(asset)
+    finally: lock.__exit__(None, None, None)
+
+async def _ascrape_asset(asset):
+    # 15m and 1m in flight together (the sync path skips 1m when 15m comes back short)
+    symbol = CONFIGS[asset]["symbol"]
+    try:
+        (c15, err15), (c1, _) = await asyncio.gather(afetch_candles(symbol, "15", 300), afetch_candles(symbol, "1", 500))
+        result = scrape_result(asset, c15, err15, c1 if len(c15) >= 50 else EMPTY_CANDLES)
+    except Exception as e: result = scrape_result(asset, error=str(e))
+    return await asyncio.to_thread(store_scrape, asset, result)
+
+FETCH_CONCURRENCY = int(os.environ.get("ORB_FETCH_CONCURRENCY", 8))
+
+async def ascrape_all(assets=None):
+    # every asset in one gather, at most FETCH_CONCURRENCY of them talking to the scraper
+    assets = list(assets or CONFIGS); gate = asyncio.Semaphore(FETCH_CONCURRENCY)
+    async def one(asset):
+        async with gate: return await ascrape_asset(asset)
+    return dict(zip(assets, await asyncio.gather(*(one(a) for a in assets))))
+
+# ═══════════════════════════════════════════════
+# DATA QUALITY
+# ═══════════════════════════════════════════════
+# Every refresh passes the 1m series through check_candles before it is cached:
+# a few whole-array passes, about a hundred microseconds for 500 bars. Only safe repairs:
+# sort out-of-order bars, keep the last copy of a duplicated timestamp, widen
+# high/low to cover open/close, and replace bad prints (non-positive prices,
+# isolated one-bar spikes) and short gaps (up to FILL_GAP missing minutes) with
+# flat bars at the previous close. Replaced and inserted bars are listed in
+# report["filled_t"], so scan_quality can count only real opening-range bars and
+# run_scan refuses ranges with less than MIN_RANGE_COVERAGE of their minutes.
+BAR_SECONDS = 60
+FILL_GAP = 2
+# a spike jumps and comes straight back (at least SPIKE_RETRACE of the way), each leg
+# > SPIKE_K median bar moves and > SPIKE_MIN_PCT; a breakout that holds is not one
+SPIKE_K = 25.0
+SPIKE_MIN_PCT = 0.005
+SPIKE_RETRACE = 0.5
+MIN_RANGE_COVERAGE = float(os.environ.get("ORB_MIN_RANGE_COVERAGE", 0.9))
+
+def check_candles(candles, step=BAR_SECONDS):
+    rec = candles.rec
+    report = {"bars":len(rec),"dropped":candles._memo.get("dropped",0),"out_of_order":0,"duplicates":0,
+        "repaired":0,"spikes":0,"gaps":0,"missing":0,"filled_t":np.empty(0, np.int64)}
+    if len(rec) < 2: return candles, report
+    t = rec["t"]; order = t[1:] < t[:-1]
+    if order.any():
+        report["out_of_order"] = int(order.sum()); rec = rec[np.argsort(t, kind="stable")]; t = rec["t"]
+    dup = t[1:] == t[:-1]
+    if dup.any():
+        # the later copy is the scraper's latest revision of that bar
+        report["duplicates"] = int(dup.sum()); rec = rec[np.r_[~dup, True]]; t = rec["t"]
+    o,h,l,c = rec["open"],rec["high"],rec["low"],rec["close"]
+    hi = np.maximum(np.maximum(o, c), np.maximum(h, l)); lo = np.minimum(np.minimum(o, c), np.minimum(h, l))
+    bad = ~(lo > 0)
+    if bad.all(): return EMPTY_CANDLES, {**report,"repaired":len(rec)}
+    if bad[0]:
+        # nothing before the first good bar to fill from
+        first = int(np.argmax(~bad)); report["repaired"] += first
+        rec = rec[first:]; t = rec["t"]; o,h,l,c = rec["open"],rec["high"],rec["low"],rec["close"]
+        hi, lo, bad = hi[first:], lo[first:], bad[first:]
+    idx = np.arange(len(rec)); any_bad = bad.any()
+    cf = c[np.maximum.accumulate(np.where(bad, 0, idx))] if any_bad else c
+    move = np.diff(cf); big = np.abs(move) > SPIKE_MIN_PCT*cf[:-1]
+    spike = np.zeros(len(rec), bool)
+    # the median is only worth taking once a cheap test finds a jump-and-return candidate
+    cand = big[:-1] & big[1:] & (move[:-1]*move[1:] < 0) & (np.abs(move[1:]) >= SPIKE_RETRACE*np.abs(move[:-1]))
+    if cand.any():
+        thr = SPIKE_K*np.median(np.abs(move))
+        spike[1:-1] = cand & (np.abs(move[:-1]) > thr) & (np.abs(move[1:]) > thr)
+        spike &= ~bad
+    fill = bad | spike
+    loose = ~fill & ((h != hi) | (l != lo))
+    if loose.any() or fill.any():
+        rec = rec.copy(); report["repaired"] += int(loose.sum() + bad.sum()); report["spikes"] = int(spike.sum())
+        rec["high"][loose] = hi[loose]; rec["low"][loose] = lo[loose]
+        prev = rec["close"][np.maximum.accumulate(np.where(fill, 0, idx))][fill]
+        for f in PRICE_FIELDS: rec[f][fill] = prev
+    miss = np.diff(t) // step - 1
+    gaps = miss > 0
+    report["gaps"] = int(gaps.sum()); report["missing"] = int(miss[gaps].sum())
+    k = np.where(gaps & (miss <= FILL_GAP), miss, 0)
+    filled_t = t[fill]
+    if k.any():
+        src = np.repeat(np.arange(len(k)), k)
+        ins = np.empty(len(src), rec.dtype)
+        ins["t"] = t[src] + (np.arange(len(src)) - np.repeat(np.cumsum(k) - k, k) + 1) * step
+        for f in PRICE_FIELDS: ins[f] = rec["close"][src]
+        rec = np.concatenate([rec, ins]); rec = rec[np.argsort(rec["t"], kind="stable")]
+        filled_t = np.sort(np.concatenate([filled_t, ins["t"]]))
+    report["filled_t"] = filled_t
+    metric_inc("candles_repaired", report["dropped"] + report["duplicates"] + report["repaired"] + len(filled_t))
+    return (candles if rec is candles.rec else Candles(rec)), report
+
+def hhmm_minutes(hhmm): return hhmm//100*60 + hhmm%100
+
+def filled_mask(candles, report):
+    # True for bars check_candles made up; they never form an FVG or set an entry
+    if not report or not len(report["filled_t"]): return np.zeros(len(candles), bool)
+    return np.isin(candles.t, report["filled_t"])
+
+def fvg_windows(filled):
+    # candidate k is the bar triple k, k+1, k+2: usable only if all three are real bars
+    return ~(filled[:-2] | filled[1:-1] | filled[2:])
+
+def scan_quality(report, session, or_candles, config):
+    # 100 × share of the opening range's minutes with a real bar × the same share for
+    # the session so far; duplicates and reordering are repaired exactly and cost nothing
+    filled_t = report["filled_t"] if report else np.empty(0, np.int64)
+    expected = hhmm_minutes(config["range_end"]) - hhmm_minutes(config["range_start"]) + 1
+    real = int(len(or_candles) - np.isin(or_candles.t, filled_t).sum())
+    t = session.t; span = int((t[-1] - t[0]) // BAR_SECONDS) + 1 if len(t) else 0
+    session_real = int(len(t) - np.isin(t, filled_t).sum())
+    coverage = min(real/max(expected,1), 1.0)
+    q = {"score":round(100*coverage*(session_real/span if span else 0)),"range_bars":real,"range_expected":expected,
+        "range_filled":len(or_candles)-real,"session_missing":span-session_real}
+    if report: q.update({k: report[k] for k in ("dropped","duplicates","out_of_order","repaired","spikes")})
+    return q
+
 # ═══════════════════════════════════════════════
 # SESSION & WINDOW
 # ═══════════════════════════════════════════════
+# Each asset gets SessionCalendars: UTC epoch boundaries for every session day in
+# a 14-day horizon (open, end of opening range, close, ET windows), built with
+# DST-aware localization and the exchange holiday table. State questions are a
+# bisect over those boundaries.
+CALENDAR_DAYS = 14
+DAY_NAMES = ("Monday","Tuesday","Wednesday","Thursday","Friday","Saturday","Sunday")
+
+def nth_weekday(year, month, weekday, n):
+    # n-th (1-based) weekday of the month; n=-1 for the last one
+    if n > 0:
+        d = date(year, month, 1)
+        return d + timedelta(days=(weekday - d.weekday()) % 7 + 7*(n-1))
+    d = date(year, month+1, 1) - timedelta(days=1) if month < 12 else date(year, 12, 31)
+    return d - timedelta(days=(d.weekday() - weekday) % 7)
+
+def easter(year):
+    a = year % 19; b, c = divmod(year, 100); d, e = divmod(b, 4)
+    g = (8*b + 13) // 25; h = (19*a + b - d - g + 15) % 30
+    j, k = divmod(c, 4); m = (a + 11*h) // 319
+    r = (2*e + 2*j - k - h + m + 32) % 7
+    month = (h - m + r + 90) // 25
+    return date(year, month, (h - m + r + month + 19) % 32)
+
+def observed(d):
+    return d + timedelta(days=1) if d.weekday() == 6 else d - timedelta(days=1) if d.weekday() == 5 else d
+
+def nyse_calendar(year):
+    # -> ({date: holiday}, {date: early close HHMM})
+    hol = {nth_weekday(year,1,0,3):"Martin Luther King Jr. Day", nth_weekday(year,2,0,3):"Washington's Birthday",
+        easter(year)-timedelta(days=2):"Good Friday", nth_weekday(year,5,0,-1):"Memorial Day",
+        observed(date(year,7,4)):"Independence Day", nth_weekday(year,9,0,1):"Labor Day",
+        nth_weekday(year,11,3,4):"Thanksgiving Day", observed(date(year,12,25)):"Christmas Day"}
+    if date(year,1,1).weekday() != 5: hol[observed(date(year,1,1))] = "New Year's Day"
+    if year >= 2022: hol[observed(date(year,6,19))] = "Juneteenth"
+    early = {nth_weekday(year,11,3,4)+timedelta(days=1):1300}
+    for d in (date(year,7,3), date(year,12,24)):
+        if d.weekday() < 5 and d not in hol: early[d] = 1300
+    return hol, early
+
+HOLIDAY_CALENDARS = {"NYSE": nyse_calendar}
+
+def local_epoch(tz, day, hhmm):
+    return tz.localize(datetime(day.year, day.month, day.day, hhmm//100, hhmm%100)).timestamp()
+
+class SessionCalendar:
+    def __init__(self, asset, first_day, days=CALENDAR_DAYS):
+        c = CONFIGS[asset]; tz = SESSION_TZ[asset]; cal = HOLIDAY_CALENDARS.get(c.get("calendar"))
+        self.all_day = c["weekend"] and c["session_open"] == 0 and c["session_close"] == 2359
+        hol, early = {}, {}
+        if cal:
+            for y in {first_day.year, (first_day+timedelta(days=days)).year}:
+                h, e = cal(y); hol.update(h); early.update(e)
+        # segment i covers [bounds[i], bounds[i+1]): (state, day, open, close, note)
+        self.bounds = []; self.segs = []; self.wins = []
+        for n in range(days):
+            day = first_day + timedelta(days=n); midnight = local_epoch(tz, day, 0)
+            if not c["weekend"] and day.weekday() >= 5:
+                self.add(midnight, ("WEEKEND", day, None, None, DAY_NAMES[day.weekday()])); continue
+            if day in hol:
+                self.add(midnight, ("HOLIDAY", day, None, None, hol[day])); continue
+            close_hhmm = early.get(day, c["session_close"])
+            s_open = local_epoch(tz, day, c["session_open"])
+            s_close = local_epoch(tz, day, close_hhmm) + 60*(c["session_open"] == 0 and close_hhmm == 2359)
+            formed = local_epoch(tz, day, c["range_end"]) + 60
+            self.add(midnight, ("PRE_MARKET", day, s_open, s_close, None))
+            self.add(s_open, ("FORMING", day, s_open, s_close, None))
+            self.add(formed, ("OPEN", day, s_open, s_close, None))
+            self.add(local_epoch(tz, day, close_hhmm) + 60, ("POST_MARKET", day, s_open, s_close, None))
+            for label, w in SORTED_WINDOWS[asset]:
+                self.wins.append((local_epoch(ET, day, w["start"]), local_epoch(ET, day, w["end"]) + 60, label))
+        self.win_starts = [w[0] for w in self.wins]
+
+    def add(self, ts, seg):
+        self.bounds.append(ts); self.segs.append(seg)
+
+    def segment(self, ts):
+        return self.segs[bisect.bisect_right(self.bounds, ts) - 1]
+
+    def window_at(self, ts):
+        i = bisect.bisect_right(self.win_starts, ts) - 1
+        return self.wins[i][2] if i >= 0 and ts < self.wins[i][1] else None
+
+    def next_window(self, ts):
+        i = bisect.bisect_right(self.win_starts, ts)
+        return self.wins[i][2] if i < len(self.wins) else None
+
+    def next_window_start(self, ts):
+        i = bisect.bisect_right(self.win_starts, ts)
+        return self.win_starts[i] if i < len(self.win_starts) else float("inf")
+
+# keyed by (CALENDAR_KEY, UTC week); each calendar spans that week plus a day before
+# and six after, so next_window can always look past weekends and holidays
+CALENDARS = {}
+CALENDAR_CACHE = 256
+WEEK = 7 * 86400
+
+def calendar_for(asset, ts):
+    key = (CALENDAR_KEY[asset], int(ts // WEEK)); cal = CALENDARS.get(key)
+    if cal is None:
+        if len(CALENDARS) >= CALENDAR_CACHE: CALENDARS.clear()
+        first = datetime.fromtimestamp(key[1] * WEEK, SESSION_TZ[asset]).date() - timedelta(days=1)
+        cal = CALENDARS[key] = SessionCalendar(asset, first)
+    return cal
+
 def get_session_state(asset, now_utc):
-    config = CONFIGS[asset]
-    session_tz = pytz.timezone(config["session_tz"])
-    now_s = now_utc.astimezone(session_tz)
-    hhmm = now_s.hour*100+now_s.minute; dow = now_s.weekday()
-    if not config["weekend"] and dow >= 5:
-        return "WEEKEND", f"Markets closed — {now_s.strftime('%A')}"
-    if config["weekend"] and config["session_open"]==0 and config["session_close"]==2359:
-        if hhmm <= config["range_end"]:
-            return "FORMING", f"Daily range forming"
-        return "OPEN", None
-    if hhmm < config["session_open"]:
-        oh,om = config["session_open"]//100, config["session_open"]%100
-        hl = oh-now_s.hour; ml = om-now_s.minute
-        if ml<0: hl-=1; ml+=60
-        return "PRE_MARKET", f"Session opens in {hl}h {ml}m"
-    if hhmm > config["session_close"]:
-        return "POST_MARKET", "Session ended for today"
-    if hhmm <= config["range_end"]:
-        return "FORMING", f"Opening range forming"
+    ts = now_utc.timestamp(); cal = calendar_for(asset, ts)
+    state, day, s_open, s_close, note = cal.segment(ts)
+    if state in ("WEEKEND","HOLIDAY"): return state, f"Markets closed — {note}"
+    if state == "PRE_MARKET":
+        mins = int(s_open - ts // 60 * 60) // 60
+        return "PRE_MARKET", f"Session opens in {mins//60}h {mins%60}m"
+    if state == "POST_MARKET": return "POST_MARKET", "Session ended for today"
+    if state == "FORMING": return "FORMING", "Daily range forming" if cal.all_day else "Opening range forming"
     return "OPEN", None
 
 def get_session_progress(asset, now_utc):
-    config = CONFIGS[asset]
-    session_tz = pytz.timezone(config["session_tz"])
-    now_s = now_utc.astimezone(session_tz)
-    hhmm = now_s.hour*100+now_s.minute
-    s_open = config["session_open"]; s_close = config["session_close"]
-    if s_open == 0 and s_close == 2359: s_open = 0; s_close = 2359
-    total = s_close - s_open
-    if total <= 0: return 0
-    elapsed = hhmm - s_open
-    return max(0, min(100, round(elapsed/total*100)))
+    ts = now_utc.timestamp()
+    state, day, s_open, s_close, note = calendar_for(asset, ts).segment(ts)
+    if s_open is None or s_close <= s_open: return 0
+    return max(0, min(100, round((ts // 60 * 60 - s_open) / (s_close - s_open) * 100)))
 
 def get_current_window(asset, now_utc):
     config = CONFIGS[asset]
     if not config.get("windows"): return None, None
-    cur = now_utc.astimezone(ET); hm = cur.hour*100+cur.minute
-    for label, w in config["windows"].items():
-        if w["start"] <= hm <= w["end"]: return label, w
-    return None, None
+    label = calendar_for(asset, now_utc.timestamp()).window_at(now_utc.timestamp())
+    return (label, config["windows"][label]) if label else (None, None)
 
 def get_next_window(asset, now_utc):
-    config = CONFIGS[asset]
-    if not config.get("windows"): return None
-    cur = now_utc.astimezone(ET); hm = cur.hour*100+cur.minute
-    sw = sorted(config["windows"].items(), key=lambda x: x[1]["start"])
-    for label, w in sw:
-        if w["start"] > hm: return label
-    return sw[0][0] if sw else None
+    if not CONFIGS[asset].get("windows"): return None
+    return calendar_for(asset, now_utc.timestamp()).next_window(now_utc.timestamp())
 
 # ═══════════════════════════════════════════════
 # SCORING
@@ -288,10 +1151,18 @@ def score_trade(asset, range_size, fvg_size, speed, direction, day_name, window=
     if c["bias"] and direction == c["bias"][0]:
         score += c["bias"][1]; reasons.append(f"{direction} bias → +{c['bias'][1]}")
     min_s = c.get("min_score", 5)
-    if asset == "GOLD": conf = "HIGH" if score>=9 else "MEDIUM" if score>=7 else "LOW"
-    else: conf = "HIGH" if score>=7 else "MEDIUM" if score>=5 else "LOW"
+    high, medium = c["confidence"]
+    conf = "HIGH" if score>=high else "MEDIUM" if score>=medium else "LOW"
     return {"score":score,"take_trade":score>=min_s,"confidence":conf,"reasons":reasons}
 
+# ORB_SCORER=model scores setups with the registry's active ORBModel (e.g. a
+# learned ORB_MODEL_VERSION=v2) instead of the per-asset rule tables.
+SCORER = os.environ.get("ORB_SCORER", "rules")
+
+def score_setup(asset, range_size, fvg_size, speed, direction, day_name, session_date, window=None):
+    if SCORER == "model": return MODELS.get().score_trade(range_size, fvg_size, speed, direction, session_date)
+    return score_trade(asset, range_size, fvg_size, speed, direction, day_name, window=window)
+
 def detect_fvg(c1, c2, c3, direction):
     if direction == "LONG":
         gap = c3['low']-c1['high']
@@ -306,12 +1177,12 @@ def detect_fvg(c1, c2, c3, direction):
 # ═══════════════════════════════════════════════
 # SCANNER
 # ═══════════════════════════════════════════════
-def run_scan(asset, scraped):
+def run_scan(asset, scraped, now_utc=None, variants=False, setup_windows=False):
     config = CONFIGS[asset]
-    now = datetime.now(TZ); now_utc = now.astimezone(pytz.UTC)
+    now = datetime.now(TZ) if now_utc is None else now_utc.astimezone(TZ); now_utc = now.astimezone(pytz.UTC)
     current_window, window_info = get_current_window(asset, now_utc)
     next_window = get_next_window(asset, now_utc) if not current_window else None
-    session_tz = pytz.timezone(config["session_tz"])
+    session_tz = SESSION_TZ[asset]
     now_session = now_utc.astimezone(session_tz)
     today_session = now_session.strftime("%Y-%m-%d")
     day_name = now_session.strftime("%A")
@@ -323,10 +1194,11 @@ def run_scan(asset, scraped):
         "price":scraped.get("price"),"price_change":scraped.get("price_change"),
         "price_change_pct":scraped.get("price_change_pct"),"day_open":scraped.get("day_open"),
         "ma50":scraped.get("ma50"),"ma200":scraped.get("ma200"),
-        "session_progress":session_progress,"session_time":now_session.strftime("%H:%M ET")}
+        "session_progress":session_progress,"session_time":now_session.strftime("%H:%M ET"),"session_date":today_session}
+    if scraped.get("stale"): base["stale"] = True; base["stale_since"] = scraped.get("stale_since")
 
     session_state, session_msg = get_session_state(asset, now_utc)
-    if session_state in ("WEEKEND","PRE_MARKET","POST_MARKET"):
+    if session_state in ("WEEKEND","HOLIDAY","PRE_MARKET","POST_MARKET"):
         return {**base,"status":"CLOSED","message":session_msg}
     if scraped["status"] == "ERROR":
         return {**base,"status":"ERROR","message":scraped.get("error","Scraper failed")}
@@ -339,58 +1211,73 @@ def run_scan(asset, scraped):
     if not candles or len(candles) < 10:
         return {**base,"status":"ERROR","message":f"Not enough data ({len(candles) if candles else 0})"}
 
-    today_candles = [c for c in candles if c.get("date_et")==today_session]
+    today_candles = candles.session(today_session)
     if not today_candles:
         return {**base,"status":"FORMING","message":f"No candles for today's session yet"}
-
-    or_candles = [c for c in today_candles if config["range_start"]<=c.get("time_hhmm_et",0)<=config["range_end"]]
-
-    if session_state == "FORMING":
-        count = len(or_candles); expected = config["range_end"]-config["range_start"]+1
+    report = scraped.get("quality")
+    # bars are selected on the ET clock, which is not the session clock for every asset (crypto_utc)
+    now_et = now_utc.astimezone(ET); now_et_hm = now_et.hour*100+now_et.minute
+    if variants:
+        bias = "LONG" if trend=="BULLISH" else "SHORT"
+        base["variants"] = scan_variants(asset, today_candles, now_et_hm,
+            bias, day_name, today_session, window=current_window, filled=filled_mask(today_candles, report))
+
+    or_candles = today_candles.between(config["range_start"], config["range_end"])
+
+    if session_state == "FORMING" or config["range_start"] <= now_et_hm <= config["range_end"]:
+        count = len(or_candles); expected = hhmm_minutes(config["range_end"])-hhmm_minutes(config["range_start"])+1
         return {**base,"status":"FORMING","message":f"Opening range forming — {count}/{expected} candles",
             "range_progress":round(count/max(expected,1)*100)}
 
     if len(or_candles) == 0:
         return {**base,"status":"FORMING","message":"No opening range candles found"}
 
-    rh = round(max(c['high'] for c in or_candles),2)
-    rl = round(min(c['low'] for c in or_candles),2)
+    rh = round(float(or_candles.high.max()),2)
+    rl = round(float(or_candles.low.min()),2)
     rs = round(rh-rl,2)
     base["range_high"]=rh; base["range_low"]=rl; base["range_size"]=rs; base["range_candles"]=len(or_candles)
+    quality = base["quality"] = scan_quality(report, today_candles, or_candles, config)
+    if quality["range_bars"] < config.get("min_range_coverage", MIN_RANGE_COVERAGE)*quality["range_expected"]:
+        return {**base,"status":"NO_TRADE",
+            "message":f"Opening range incomplete ({quality['range_bars']}/{quality['range_expected']} bars) — not trading it"}
 
     if config["max_range"] and rs > config["max_range"]:
         return {**base,"status":"NO_TRADE","message":f"Range too wide (${rs} > max ${config['max_range']})"}
 
-    post_candles = [c for c in today_candles if c.get("time_hhmm_et",0)>=config["post_range_start"]]
+    post_candles = today_candles.between(config["post_range_start"])
     if len(post_candles) < 3:
         return {**base,"status":"FORMING","message":f"Waiting for post-range candles ({len(post_candles)}/3)"}
 
     bias_dir = "LONG" if trend=="BULLISH" else "SHORT"
     best_signal = None
+    usable = fvg_windows(filled_mask(post_candles, report))
 
     for i in range(len(post_candles)-2):
+        if not usable[i]: continue
         c1,c2,c3 = post_candles[i],post_candles[i+1],post_candles[i+2]
+        # replays score a setup in the window its setup bar fell in, not the one now falls in
+        window = calendar_for(asset, c3["t"]).window_at(c3["t"]) if setup_windows else current_window
         if c2['close'] > rh:
             fvg = detect_fvg(c1,c2,c3,"LONG")
             if fvg['valid']:
-                pred = score_trade(asset,rs,fvg['size'],i+1,"LONG",day_name,window=current_window)
+                pred = score_setup(asset,rs,fvg['size'],i+1,"LONG",day_name,today_session,window=window)
                 sig = {"direction":"LONG","entry":round(fvg['entry'],2),"stop":rl,
-                    "target":round(fvg['entry']+(fvg['entry']-rl),2),"fvg_size":fvg['size'],
+                    "target":round(fvg['entry']+config["target_rr"]*(fvg['entry']-rl),2),"fvg_size":fvg['size'],
                     "speed":i+1,"score":pred["score"],"confidence":pred["confidence"],
                     "reasons":pred["reasons"],"take_trade":pred["take_trade"],
-                    "fvg_detected":True,"fvg_time":c2.get("time_et",""),"aligned":bias_dir=="LONG"}
-                if bias_dir=="LONG" or pred["score"]>=CONFIGS[asset]["min_score"]:
+                    "fvg_detected":True,"fvg_time":c2.get("time_et",""),"setup_t":c3["t"],"aligned":bias_dir=="LONG"}
+                if bias_dir=="LONG" or pred["take_trade"]:
                     best_signal = sig
         if c2['close'] < rl:
             fvg = detect_fvg(c1,c2,c3,"SHORT")
             if fvg['valid']:
-                pred = score_trade(asset,rs,fvg['size'],i+1,"SHORT",day_name,window=current_window)
+                pred = score_setup(asset,rs,fvg['size'],i+1,"SHORT",day_name,today_session,window=window)
                 sig = {"direction":"SHORT","entry":round(fvg['entry'],2),"stop":rh,
-                    "target":round(fvg['entry']-(rh-fvg['entry']),2),"fvg_size":fvg['size'],
+                    "target":round(fvg['entry']-config["target_rr"]*(rh-fvg['entry']),2),"fvg_size":fvg['size'],
                     "speed":i+1,"score":pred["score"],"confidence":pred["confidence"],
                     "reasons":pred["reasons"],"take_trade":pred["take_trade"],
-                    "fvg_detected":True,"fvg_time":c2.get("time_et",""),"aligned":bias_dir=="SHORT"}
-                if bias_dir=="SHORT" or pred["score"]>=CONFIGS[asset]["min_score"]:
+                    "fvg_detected":True,"fvg_time":c2.get("time_et",""),"setup_t":c3["t"],"aligned":bias_dir=="SHORT"}
+                if bias_dir=="SHORT" or pred["take_trade"]:
                     best_signal = sig
 
     if best_signal:
@@ -405,55 +1292,1077 @@ def run_scan(asset, scraped):
     else: msg = "Price INSIDE range — No breakout yet"
     return {**base,"status":"SCANNING","message":msg,"fvg_detected":False}
 
+# Opening-range lengths (minutes from range_start) × reward:risk targets reported
+# by /api/scan?variants=1. One pass over the session: the FVG candidates are found
+# once, each range length only filters them by its own breakout levels, and each
+# RR only moves the target of that range's signal.
+VARIANT_RANGES = (5, 15, 30)
+VARIANT_RR = (1.0, 1.5, 2.0)
+
+def add_minutes(hhmm, minutes):
+    m = hhmm//100*60 + hhmm%100 + minutes
+    return m//60*100 + m%60
+
+def scan_variants(asset, session, now_hm, bias_dir, day_name, session_date, window=None, filled=None):
+    config = CONFIGS[asset]
+    hm = session.hhmm_et(); o, h, l, c = session.open, session.high, session.low, session.close
+    filled = np.zeros(len(session), bool) if filled is None else filled
+    # candidate k is the bar triple k, k+1, k+2 with k+1 the breakout bar (detect_fvg's rules)
+    long_gap = l[2:]-h[:-2]; short_gap = l[:-2]-h[2:]; usable = fvg_windows(filled)
+    long_ok = (long_gap>0)&(c[1:-1]>o[1:-1])&usable; short_ok = (short_gap>0)&(c[1:-1]<o[1:-1])&usable
+    out = []
+    for minutes in VARIANT_RANGES:
+        end = add_minutes(config["range_start"], minutes-1); post = add_minutes(end, 1)
+        head = {"range":f"{minutes}m","range_start":config["range_start"],"range_end":end}
+        in_or = (hm>=config["range_start"])&(hm<=end)
+        p0 = int(np.searchsorted(hm, post))
+        if now_hm <= end or not in_or.any():
+            out += [{**head,"rr":rr,"status":"FORMING"} for rr in VARIANT_RR]; continue
+        rh = round(float(h[in_or].max()),2); rl = round(float(l[in_or].min()),2); rs = round(rh-rl,2)
+        head.update(range_high=rh, range_low=rl, range_size=rs, range_bars=int((in_or & ~filled).sum()))
+        # run_scan's coverage gate, per range length
+        if head["range_bars"] < config.get("min_range_coverage", MIN_RANGE_COVERAGE)*minutes:
+            out += [{**head,"rr":rr,"status":"NO_TRADE"} for rr in VARIANT_RR]; continue
+        if config["max_range"] and rs > config["max_range"]:
+            out += [{**head,"rr":rr,"status":"NO_TRADE"} for rr in VARIANT_RR]; continue
+        if len(hm)-p0 < 3:
+            out += [{**head,"rr":rr,"status":"FORMING"} for rr in VARIANT_RR]; continue
+        longs = np.flatnonzero(long_ok[p0:] & (c[p0+1:-1] > rh)) + p0
+        shorts = np.flatnonzero(short_ok[p0:] & (c[p0+1:-1] < rl)) + p0
+        # run_scan keeps the last aligned or tradeable candidate, so walk them newest first
+        cands = sorted([(k,1,"LONG") for k in longs.tolist()] + [(k,0,"SHORT") for k in shorts.tolist()], reverse=True)
+        sig = None
+        for k, _, direction in cands:
+            size = round(float(long_gap[k] if direction=="LONG" else short_gap[k]),2)
+            pred = score_setup(asset,rs,size,k-p0+1,direction,day_name,session_date,window=window)
+            if bias_dir==direction or pred["take_trade"]:
+                entry = float(l[k+2] if direction=="LONG" else h[k+2])
+                sig = {"direction":direction,"entry":round(entry,2),"stop":rl if direction=="LONG" else rh,"fvg_size":size,
+                    "speed":k-p0+1,"score":pred["score"],"confidence":pred["confidence"],"take_trade":pred["take_trade"],
+                    "fvg_time":session[k+1]["time_et"],"aligned":bias_dir==direction}
+                break
+        for rr in VARIANT_RR:
+            if not sig: out.append({**head,"rr":rr,"status":"SCANNING"}); continue
+            stop = sig["stop"]
+            out.append({**head,"rr":rr,"status":"TRADE" if sig["take_trade"] else "SKIP",**sig,
+                "target":round(entry+rr*(entry-stop),2)})
+    return out
+
+# ═══════════════════════════════════════════════
+# BATCH SCAN
+# ═══════════════════════════════════════════════
+# Scans many (asset, session date) jobs on a process pool. A job carries its own
+# candles ({"t","o","h","l","c"} columns or a list of bars) or "store": true to
+# read that session from the candle store, plus optional ma50/ma200 (taken from
+# stored 15m bars when missing), and is evaluated as of the session close (or "as_of", epoch seconds), with bars
+# after that instant dropped so nothing looks ahead. Setups are scored in the window
+# of their own setup bar, since the close can fall in a window of its own (GOLD's 16:00).
+BATCH_WORKERS = int(os.environ.get("ORB_BATCH_WORKERS", os.cpu_count() or 1))
+BATCH_CHUNK = 16
+_batch_pool = None
+
+def batch_pool(workers):
+    global _batch_pool
+    if _batch_pool is None or _batch_pool._max_workers != workers:
+        from concurrent.futures import ProcessPoolExecutor
+        import multiprocessing
+        if _batch_pool: _batch_pool.shutdown(wait=False)
+        # spawn, as start_shards does: forking a threaded server copies held locks into the children
+        _batch_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    return _batch_pool
+
+def scan_job(job):
+    asset = job.get("asset"); day = job.get("date")
+    if asset not in CONFIGS: return {"asset":asset,"date":day,"status":"ERROR","message":f"Unknown asset: {asset}"}
+    try:
+        session_day = datetime.strptime(day, "%Y-%m-%d").date()
+        as_of = float(job["as_of"]) if job.get("as_of") is not None else local_epoch(SESSION_TZ[asset], session_day, CONFIGS[asset]["session_close"])
+        candles, err = job_candles(job, asset, session_day)
+    except (KeyError, TypeError, ValueError) as e:
+        return {"asset":asset,"date":day,"status":"ERROR","message":f"Bad job: {e}"}
+    candles, quality = check_candles(Candles(candles.rec[candles.t <= as_of]))
+    ma50, ma200 = job.get("ma50"), job.get("ma200")
+    if job.get("store") and (ma50 is None or ma200 is None): ma50, ma200 = stored_mas(asset, as_of)
+    scraped = {"status":"OK" if len(candles) else "ERROR","error":err or (None if len(candles) else "No candles"),
+        "candles":candles,"quality":quality,"source":"batch","ma50":ma50,"ma200":ma200,"price":round(float(candles.close[-1]),2) if len(candles) else None}
+    return {"date":day,**run_scan(asset, scraped, datetime.fromtimestamp(as_of, pytz.UTC), setup_windows=True)}
+
+def job_candles(job, asset, session_day):
+    if not job.get("store"): return parse_candles(job["candles"])
+    tz = SESSION_TZ[asset]
+    start = local_epoch(tz, session_day, 0); end = local_epoch(tz, session_day + timedelta(days=1), 0)
+    return store_for(asset).read(CONFIGS[asset]["symbol"], "1", start, end), None
+
+def stored_mas(asset, as_of):
+    # 50/200 bar means of stored 15m closes up to as_of, like scrape_asset
+    closes = store_for(asset).read(CONFIGS[asset]["symbol"], "15", as_of - 200*15*60*4, as_of + 1).close[-200:]
+    if len(closes) < 50: return None, None
+    return round(float(closes[-50:].mean()), 2), round(float(closes.mean()), 2)
+
+def _scan_chunk(chunk):
+    return [{"index":i,**scan_job(job)} for i, job in chunk]
+
+def chunked(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size: yield chunk; chunk = []
+    if chunk: yield chunk
+
+def scan_batch(jobs, workers=None, chunksize=BATCH_CHUNK, ordered=True):
+    # yields one result per job (with its "index"); at most 2 chunks per worker in flight
+    workers = workers or BATCH_WORKERS
+    chunks = chunked(enumerate(jobs), chunksize)
+    if workers <= 1:
+        for chunk in chunks: yield from _scan_chunk(chunk)
+        return
+    pool = batch_pool(workers); inflight = []
+    for chunk in chunks:
+        inflight.append(pool.submit(_scan_chunk, chunk))
+        if len(inflight) >= 2 * workers:
+            if ordered: yield from inflight.pop(0).result()
+            else:
+                done, _ = wait(inflight, return_when=FIRST_COMPLETED)
+                for f in done: inflight.remove(f); yield from f.result()
+    if ordered:
+        for f in inflight: yield from f.result()
+    else:
+        while inflight:
+            done, _ = wait(inflight, return_when=FIRST_COMPLETED)
+            for f in done: inflight.remove(f); yield from f.result()
+
+# ═══════════════════════════════════════════════
+# POSITIONS
+# ═══════════════════════════════════════════════
+# Follows every TRADE signal to its exit, one new candle at a time:
+# pending -> filled (price trades back to the entry) -> target | stop, or
+# expired / session_close when the session ends first. Each position remembers the
+# last bar it has seen, so a poll only walks bars that arrived since (searchsorted +
+# O(1) per bar). Rules match features.forward_outcome: stop counts from the fill
+# bar, target from the bar after, a bar touching both is a stop.
+# Transitions go to an append-only JSONL journal that is the source of truth: state
+# is the fold of its events, workers tail what the others appended (under flock)
+# and an (id, event) pair is written once, so restarts and multiple workers agree.
+JOURNAL_PATH = os.environ.get("ORB_JOURNAL", os.path.join(ROOT, "data", "positions.jsonl"))
+
+class PositionTracker:
+    def __init__(self, path=JOURNAL_PATH):
+        self.path = path; self.lock = threading.RLock()
+        self.open = {}; self.closed = {}; self.seen = set(); self.offset = 0
+
+    def _apply(self, ev):
+        key = (ev["id"], ev["event"])
+        if key in self.seen: return
+        self.seen.add(key); kind = ev["event"]
+        if kind == "open":
+            pos = {k:v for k,v in ev.items() if k not in ("event","t")}
+            pos.update(state="pending", opened_t=ev["t"], t_seen=ev["t"], last=None)
+            self.open[ev["id"]] = pos
+        elif kind == "fill" and ev["id"] in self.open:
+            pos = self.open[ev["id"]]
+            # walk again from the fill bar (not before it) so replay rebuilds MAE/MFE from the candles
+            pos.update(state="filled", fill_t=ev["t"], t_seen=ev["t"]-1, hi=pos["entry"], lo=pos["entry"])
+        elif kind == "exit" and ev["id"] in self.open:
+            pos = self.open.pop(ev["id"])
+            for k in ("t_seen","hi","lo","last"): pos.pop(k, None)
+            pos.update(state="closed", **{k:v for k,v in ev.items() if k not in ("event","id","t")}, exit_t=ev["t"])
+            self.closed[ev["id"]] = pos
+
+    def _sync(self):
+        # fold lines appended since our last read (ours and other workers')
+        try:
+            with open(self.path, "rb") as f: f.seek(self.offset); data = f.read()
+        except FileNotFoundError: return
+        data = data[:data.rfind(b"\n")+1]; self.offset += len(data)
+        for line in data.splitlines():
+            if line.strip(): self._apply(json.loads(line))
+
+    def _emit(self, ev):
+        if (ev["id"], ev["event"]) in self.seen: return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with file_lock(self.path + ".lock"):
+            self._sync()
+            if (ev["id"], ev["event"]) in self.seen: return
+            with open(self.path, "ab") as f: f.write(dumps(ev) + b"\n")
+            self._sync()
+        metric_inc(f"positions_{ev['event']}")
+
+    def observe(self, asset, result, candles, now=None):
+        # one scan result + the candles it was derived from
+        with self.lock:
+            self._sync()
+            if result.get("status") == "TRADE" and result.get("setup_t"):
+                self._open(asset, result)
+            now = time.time() if now is None else now
+            t = candles.t if candles else None
+            for pid in [p for p, pos in self.open.items() if pos["asset"] == asset]:
+                pos = self.open[pid]
+                if t is not None:
+                    for i in range(int(np.searchsorted(t, pos["t_seen"], side="right")), len(t)):
+                        if not self._step(pid, pos, candles, i): break
+                if pid in self.open and now >= pos["expires"]: self._expire(pid, pos, int(now))
+
+    def _open(self, asset, r):
+        setup_t = int(r["setup_t"]); tz = SESSION_TZ[asset]
+        day = datetime.fromtimestamp(setup_t, pytz.UTC).astimezone(tz).date()
+        pid = f"{asset}:{day}:{r['direction']}"
+        if (pid, "open") in self.seen: return
+        self._emit({"event":"open","id":pid,"t":setup_t,"asset":asset,"session":str(day),
+            "direction":r["direction"],"entry":r["entry"],"stop":r["stop"],"target":r["target"],
+            "score":r.get("score"),"confidence":r.get("confidence"),
+            "expires":int(local_epoch(tz, day, CONFIGS[asset]["session_close"]))})
+
+    def _step(self, pid, pos, candles, i):
+        # -> False once the position is closed
+        bar_t = int(candles.t[i]); hi = float(candles.high[i]); lo = float(candles.low[i])
+        if bar_t >= pos["expires"]: self._expire(pid, pos, bar_t); return False
+        long = pos["direction"] == "LONG"; entry = pos["entry"]
+        pos["t_seen"] = bar_t; pos["last"] = float(candles.close[i])
+        if pos["state"] == "pending":
+            if not (lo <= entry if long else hi >= entry): return True
+            self._emit({"event":"fill","id":pid,"t":bar_t,"price":entry})
+            pos["t_seen"] = bar_t
+        pos["hi"] = max(pos["hi"], hi); pos["lo"] = min(pos["lo"], lo)
+        if lo <= pos["stop"] if long else hi >= pos["stop"]:
+            self._exit(pid, pos, bar_t, "stop", pos["stop"]); return False
+        if bar_t > pos["fill_t"] and (hi >= pos["target"] if long else lo <= pos["target"]):
+            self._exit(pid, pos, bar_t, "target", pos["target"]); return False
+        return True
+
+    def _expire(self, pid, pos, t):
+        if pos["state"] == "pending": self._emit({"event":"exit","id":pid,"t":t,"outcome":"expired"})
+        else: self._exit(pid, pos, t, "session_close", pos["last"] if pos["last"] is not None else pos["entry"])
+
+    def _exit(self, pid, pos, t, outcome, price):
+        self._emit({"event":"exit","id":pid,"t":t,"outcome":outcome,"price":round(price,2),**self.excursion(pos, price)})
+
+    @staticmethod
+    def excursion(pos, price):
+        if "hi" not in pos: return {}
+        entry = pos["entry"]; risk = abs(entry - pos["stop"]) or float("nan"); long = pos["direction"] == "LONG"
+        mfe, mae = (pos["hi"]-entry, entry-pos["lo"]) if long else (entry-pos["lo"], pos["hi"]-entry)
+        return {"r":round(((price-entry) if long else (entry-price))/risk, 3),"mae":round(max(mae,0),2),"mfe":round(max(mfe,0),2)}
+
+    def snapshot(self, asset=None, limit=100):
+        with self.lock:
+            self._sync()
+            live = []
+            for p in self.open.values():
+                if asset not in (None, p["asset"]): continue
+                row = {k:v for k,v in p.items() if k not in ("hi","lo","t_seen")}
+                if p["state"] == "filled" and p["last"] is not None: row.update(self.excursion(p, p["last"]))
+                live.append(row)
+            closed = [p for p in self.closed.values() if asset in (None, p["asset"])]
+        summary = {}
+        for p in closed:
+            if "r" not in p: continue
+            a = summary.setdefault(p["asset"], {"trades":0,"wins":0,"losses":0,"total_r":0.0})
+            a["trades"] += 1; a["wins"] += p["outcome"]=="target"; a["losses"] += p["outcome"]=="stop"; a["total_r"] = round(a["total_r"]+p["r"], 3)
+        for a in summary.values(): a["win_rate"] = round(a["wins"]/a["trades"]*100, 1); a["avg_r"] = round(a["total_r"]/a["trades"], 3)
+        closed.sort(key=lambda p: p["exit_t"], reverse=True)
+        return {"open":live,"closed":closed[:limit],"summary":summary}
+
+POSITIONS = PositionTracker()
+
+def track(asset, result, scraped):
+    # tracking must never fail a scan (e.g. read-only filesystem on serverless)
+    SIGNALS.record(asset, result); ALERTS.notify(asset, result)
+    try: POSITIONS.observe(asset, result, scraped.get("candles"))
+    except OSError as e: metric_inc("journal_errors"); metric_set("journal_error", str(e))
+
+# ═══════════════════════════════════════════════
+# SIGNAL HISTORY
+# ═══════════════════════════════════════════════
+# Scan results are kept in SQLite (ORB_SIGNALS, empty disables): `signals` holds the
+# latest status and signal per asset and session, `transitions` gets a row each
+# time status, direction or setup changes. record() only compares with the last
+# key it queued for the asset and hands changes to a writer thread, so requests
+# never wait on the disk; the writer drains the queue in batches of up to
+# SIGNAL_BATCH, one transaction each. Writes re-check the stored row inside
+# BEGIN IMMEDIATE, so workers and shards sharing the file (WAL) log a transition once.
+# Queries page by keyset, newest session first, over indexes that lead with the
+# filter columns, so a page costs the same over years of history as over a day.
+SIGNALS_PATH = os.environ.get("ORB_SIGNALS", os.path.join(ROOT, "data", "signals.db"))
+SIGNAL_QUEUE = 10000
+SIGNAL_BATCH = 500
+SIGNAL_COLUMNS = ("asset","session_date","day","window","status","direction","confidence","score","entry","stop",
+    "target","range_high","range_low","range_size","fvg_size","speed","setup_t","quality","message")
+# closed vocabularies are checked up front: a value that can never match would scan the table
+SIGNAL_VALUES = {"status":("FORMING","SCANNING","SKIP","TRADE","NO_TRADE"),"direction":("LONG","SHORT"),
+    "confidence":("HIGH","MEDIUM","LOW","REJECTED"),
+    "day":("Monday","Tuesday","Wednesday","Thursday","Friday","Saturday","Sunday")}
+SIGNAL_FIELDS = """asset TEXT NOT NULL, session_date TEXT NOT NULL, day TEXT, window TEXT, status TEXT NOT NULL,
+    direction TEXT, confidence TEXT, score INTEGER, entry REAL, stop REAL, target REAL, range_high REAL,
+    range_low REAL, range_size REAL, fvg_size REAL, speed INTEGER, setup_t INTEGER, quality INTEGER, message TEXT"""
+SIGNAL_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS signals ({SIGNAL_FIELDS}, first_t REAL NOT NULL, updated_t REAL NOT NULL,
+    PRIMARY KEY (asset, session_date)) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS signals_by_date ON signals (session_date, asset);
+CREATE INDEX IF NOT EXISTS signals_by_status ON signals (status, session_date, asset);
+CREATE INDEX IF NOT EXISTS signals_by_day ON signals (day, session_date, asset);
+CREATE INDEX IF NOT EXISTS signals_by_window ON signals (window, session_date, asset);
+CREATE TABLE IF NOT EXISTS transitions (id INTEGER PRIMARY KEY, t REAL NOT NULL, prev_status TEXT, {SIGNAL_FIELDS});
+CREATE INDEX IF NOT EXISTS transitions_by_asset ON transitions (asset, id);
+CREATE INDEX IF NOT EXISTS transitions_by_status ON transitions (status, id);
+"""
+_SIGNAL_KEY = tuple(SIGNAL_COLUMNS.index(k) for k in ("status","direction","setup_t"))
+_SIGNAL_UPSERT = (f"INSERT INTO signals ({','.join(SIGNAL_COLUMNS)},first_t,updated_t) VALUES ({','.join('?'*(len(SIGNAL_COLUMNS)+2))}) "
+    f"ON CONFLICT (asset, session_date) DO UPDATE SET {','.join(f'{k}=excluded.{k}' for k in SIGNAL_COLUMNS[2:])},updated_t=excluded.updated_t")
+_SIGNAL_TRANSITION = f"INSERT INTO transitions (t,prev_status,{','.join(SIGNAL_COLUMNS)}) VALUES ({','.join('?'*(len(SIGNAL_COLUMNS)+2))})"
+
+class SignalStore:
+    def __init__(self, path=SIGNALS_PATH):
+        self.path = path; self.lock = threading.Lock(); self.local = threading.local()
+        self.queue = queue.Queue(SIGNAL_QUEUE); self.last = {}; self.thread = None; self.conn = None
+
+    def record(self, asset, r, block=False):
+        if not self.path or r.get("status") in (None, "CLOSED", "ERROR") or not r.get("session_date"): return
+        quality = r.get("quality") or {}
+        row = tuple(quality.get("score") if k == "quality" else asset if k == "asset" else r.get(k) for k in SIGNAL_COLUMNS)
+        key = (row[1],) + tuple(row[i] for i in _SIGNAL_KEY)
+        if self.last.get(asset) == key: return
+        try: self.queue.put((time.time(), row), block=block)
+        except queue.Full: metric_inc("signals_dropped"); return
+        self.last[asset] = key
+        if self.thread is None:
+            with self.lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self._writer, name="signals-writer", daemon=True); self.thread.start()
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL"); conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SIGNAL_SCHEMA)
+        return conn
+
+    def _writer(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < SIGNAL_BATCH:
+                try: batch.append(self.queue.get_nowait())
+                except queue.Empty: break
+            rows = [b for b in batch if b is not None]; t0 = time.time()
+            try:
+                if rows: metric_inc("signals_transitions", self._write(rows))
+            except (OSError, sqlite3.Error) as e: metric_inc("signals_errors"); metric_set("signals_error", str(e))
+            else:
+                if rows: metric_time("signals_commit", time.time() - t0)
+            finally:
+                for _ in batch: self.queue.task_done()
+            if len(rows) < len(batch): return
+
+    def _write(self, rows):
+        if self.conn is None: self.conn = self._connect()
+        conn = self.conn; changed = 0
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for t, row in rows:
+                prev = conn.execute("SELECT status,direction,setup_t FROM signals WHERE asset=? AND session_date=?", row[:2]).fetchone()
+                if prev == tuple(row[i] for i in _SIGNAL_KEY): continue
+                conn.execute(_SIGNAL_UPSERT, (*row, t, t))
+                conn.execute(_SIGNAL_TRANSITION, (t, prev[0] if prev else None, *row)); changed += 1
+            conn.execute("COMMIT")
+        except BaseException: conn.execute("ROLLBACK"); raise
+        return changed
+
+    def flush(self):
+        if self.thread is not None: self.queue.join()
+
+    def close(self):
+        if self.thread is not None and self.thread.is_alive():
+            self.queue.put(None); self.thread.join(10)
+        self.thread = None
+
+    def query(self, filters=None, since=None, until=None, limit=100, cursor=None, transitions=False):
+        # filters: column -> list of accepted values; cursor: next_cursor of the previous page
+        conn = getattr(self.local, "conn", None)
+        if conn is None: conn = self.local.conn = self._connect()
+        where, args = [], []
+        for col, values in (filters or {}).items():
+            if values: where.append(f"{col} IN ({','.join('?'*len(values))})"); args += values
+        if since: where.append("session_date >= ?"); args.append(since)
+        if until: where.append("session_date <= ?"); args.append(until)
+        if transitions:
+            table, order = "transitions", "id DESC"
+            if cursor: where.append("id < ?"); args.append(int(cursor))
+        else:
+            table, order = "signals", "session_date DESC, asset DESC"
+            if cursor:
+                day, _, asset = cursor.partition("|")
+                where.append("(session_date, asset) < (?, ?)"); args += [day, asset]
+        cur = conn.execute(f"SELECT * FROM {table}" + (f" WHERE {' AND '.join(where)}" if where else "") +
+            f" ORDER BY {order} LIMIT ?", args + [limit + 1])
+        names = [d[0] for d in cur.description]; rows = [dict(zip(names, r)) for r in cur.fetchall()]
+        more = len(rows) > limit; rows = rows[:limit]
+        nxt = (str(rows[-1]["id"]) if transitions else f"{rows[-1]['session_date']}|{rows[-1]['asset']}") if more else None
+        return {"count":len(rows),"next_cursor":nxt,"signals":rows}
+
+    def info(self):
+        return {"path":self.path or None,"queued":self.queue.qsize(),"writer":self.thread is not None and self.thread.is_alive()}
+
+SIGNALS = SignalStore()
+
+# ═══════════════════════════════════════════════
+# ALERTS
+# ═══════════════════════════════════════════════
+# A scan flipping to TRADE raises one alert per (asset, session, direction). On the
+# scan path notify() only does a non-blocking put onto the dispatcher's bounded
+# queue (ALERT_QUEUE; overflow is dropped and counted), so a slow receiver never
+# shows in /api/scan latency. The dispatcher task lingers up to ALERT_LINGER for a
+# batch of up to ALERT_BATCH, leases it for ALERT_LEASE in an append-only JSONL log
+# under flock (workers and shards that scan the same asset alert once, as in the
+# positions journal), then POSTs {"alerts": [...]} to ORB_ALERT_WEBHOOK, retrying
+# with exponential backoff and jitter. Only a successful POST logs the alerts as
+# delivered; a failed one releases the lease, and the next scan still in TRADE
+# offers them again, here or on another worker. Without a webhook the log itself is
+# the sink. If the log can't be written (read-only deploys), dedup falls back to
+# this process's memory.
+ALERT_WEBHOOK = os.environ.get("ORB_ALERT_WEBHOOK", "")
+ALERT_LOG = os.environ.get("ORB_ALERT_LOG", os.path.join(tempfile.gettempdir(), "orb-alerts.jsonl"))
+ALERT_QUEUE = 1000
+ALERT_BATCH = 50
+ALERT_LINGER = 0.5
+ALERT_RETRIES = 5
+ALERT_BACKOFF = 1.0
+ALERT_LEASE = 300
+
+class AlertDispatcher:
+    def __init__(self, log=ALERT_LOG, webhook=ALERT_WEBHOOK):
+        self.log = log; self.webhook = webhook; self.lock = threading.Lock()
+        self.loop = None; self.queue = None; self.task = None
+        self.seen = set(); self.sent = set(); self.leases = {}; self.offset = 0; self.inflight = 0
+
+    def start(self):
+        # binds to the running loop: the app's, or a shard process's own
+        loop = asyncio.get_running_loop()
+        if self.loop is loop and self.task and not self.task.done(): return
+        self.loop = loop; self.queue = asyncio.Queue(ALERT_QUEUE); self.task = loop.create_task(self._run())
+
+    def notify(self, asset, r):
+        if r.get("status") != "TRADE" or not r.get("direction"): return
+        loop = self.loop
+        if loop is None or loop.is_closed(): return
+        key = (asset, r.get("session_date"), r["direction"])
+        with self.lock:
+            if key in self.seen: return
+            # only the asset's current session needs remembering
+            self.seen = {k for k in self.seen if k[0] != asset or k[1] == key[1]}; self.seen.add(key)
+        alert = {"id":":".join(map(str, key)),"asset":asset,"session":key[1],"direction":key[2],
+            **{k: r.get(k) for k in ("entry","stop","target","score","confidence","window","message","setup_t")},"t":time.time()}
+        try: here = asyncio.get_running_loop() is loop
+        except RuntimeError: here = False
+        if here: self._put(alert)
+        else: loop.call_soon_threadsafe(self._put, alert)
+
+    def _put(self, alert):
+        try: self.queue.put_nowait(alert)
+        except asyncio.QueueFull: metric_inc("alerts_dropped")
+        metric_set("alerts_queued", self.queue.qsize())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]; deadline = loop.time() + ALERT_LINGER
+            while len(batch) < ALERT_BATCH:
+                try: batch.append(await asyncio.wait_for(self.queue.get(), max(0, deadline - loop.time())))
+                except asyncio.TimeoutError: break
+            metric_set("alerts_queued", self.queue.qsize()); self.inflight = len(batch)
+            try: await self._dispatch(batch)
+            except Exception as e: metric_inc("alerts_failed", len(batch)); metric_set("alerts_error", str(e))
+            finally:
+                self.inflight = 0
+                for _ in batch: self.queue.task_done()
+
+    async def _dispatch(self, batch):
+        fresh = await asyncio.to_thread(self._claim, batch)
+        if not fresh: return
+        try:
+            if self.webhook: await self._post(fresh)
+        except Exception:
+            await asyncio.to_thread(self._release, fresh); raise
+        await asyncio.to_thread(self._deliver, fresh)
+        now = time.time()
+        for a in fresh: metric_time("alert_delivery", now - a["t"])
+        metric_inc("alerts_sent", len(fresh))
+
+    def _claim(self, batch):
+        # -> the alerts nobody has delivered or leased yet, now leased to this worker;
+        # the ones still leased elsewhere are forgotten so a later scan offers them again
+        now = time.time()
+        fresh = self._update(batch, lambda a: a["id"] not in self.sent and self.leases.get(a["id"], 0) <= now,
+            lambda a: {"id":a["id"],"lease":now + ALERT_LEASE})
+        ids = {a["id"] for a in fresh}
+        self._forget(a for a in batch if a["id"] not in ids and a["id"] not in self.sent)
+        return fresh
+
+    def _deliver(self, alerts):
+        self._update(alerts, lambda a: a["id"] not in self.sent, lambda a: a)
+
+    def _release(self, alerts):
+        self._update(alerts, lambda a: a["id"] not in self.sent, lambda a: {"id":a["id"],"lease":0})
+        self._forget(alerts)
+
+    def _forget(self, alerts):
+        with self.lock: self.seen -= {(a["asset"], a["session"], a["direction"]) for a in alerts}
+
+    def _apply(self, rec):
+        # log lines: {"id", "lease": until} leases (0 releases), anything else is a delivered alert
+        if "lease" in rec: self.leases[rec["id"]] = rec["lease"]
+        else: self.sent.add(rec["id"]); self.leases.pop(rec["id"], None)
+
+    def _update(self, alerts, pick, line):
+        # -> the alerts pick() keeps against the log's current state, with line(a) appended
+        # for each; in memory only once the log turns out unwritable
+        if self.log:
+            try:
+                os.makedirs(os.path.dirname(self.log) or ".", exist_ok=True)
+                with file_lock(self.log + ".lock"):
+                    try:
+                        with open(self.log, "rb") as f: f.seek(self.offset); data = f.read()
+                    except FileNotFoundError: data = b""
+                    data = data[:data.rfind(b"\n")+1]; self.offset += len(data)
+                    for raw in data.splitlines():
+                        if raw.strip(): self._apply(json.loads(raw))
+                    picked = [a for a in alerts if pick(a)]; lines = [line(a) for a in picked]
+                    if lines:
+                        out = b"".join(dumps(l) + b"\n" for l in lines)
+                        with open(self.log, "ab") as f: f.write(out)
+                        self.offset += len(out)
+                    for l in lines: self._apply(l)
+                    return picked
+            except OSError as e:
+                self.log = None; metric_set("alerts_log_error", str(e))
+        picked = [a for a in alerts if pick(a)]
+        for a in picked: self._apply(line(a))
+        return picked
+
+    async def _post(self, alerts):
+        body = dumps({"alerts":alerts}); headers = {"Content-Type":"application/json"}
+        for attempt in range(ALERT_RETRIES + 1):
+            if attempt:
+                metric_inc("alerts_retried")
+                await asyncio.sleep(min(ALERT_BACKOFF * 2**(attempt-1), 60) * random.uniform(0.5, 1))
+            try: status, _, _ = await ahttp_request("POST", self.webhook, body, headers)
+            except Exception as e: err = str(e) or type(e).__name__; continue
+            if status < 400: return
+            err = f"HTTP {status}"
+            # the receiver refused the payload itself; sending it again won't help
+            if status < 500 and status not in (408, 429): break
+        raise RuntimeError(f"Webhook failed: {err}")
+
+    async def close(self, timeout=5):
+        if self.task is None or self.loop is not asyncio.get_running_loop(): return
+        try: await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError: pass
+        self.task.cancel(); self.task = None
+
+    def info(self):
+        return {"sink":"webhook" if self.webhook else "log" if self.log else "memory","running":bool(self.task and not self.task.done()),
+            "queued":self.queue.qsize() if self.queue else 0,"inflight":self.inflight}
+
+ALERTS = AlertDispatcher()
+
+# ═══════════════════════════════════════════════
+# BACKGROUND INGESTION
+# ═══════════════════════════════════════════════
+# Long-running deployments (uvicorn) only: ORB_INGEST=background refreshes every
+# asset once per 1m bar close (one gather of async scrapes, then the scans in a
+# thread) and handlers serve the snapshots. Serverless stays on-demand since
+# nothing runs between invocations.
+# With ORB_SHARDS > 1 the ticks run in one spawned process per shard instead, each
+# over its own assets. Shards publish pre-serialized snapshots to the shared CACHE
+# (file or shm backend), and every API worker merges them into one response.
+# Refreshed bars also go to the asset's candle store (store_for, so a shard feeds its
+# own), extending the history backfill.py laid down. A refresh returns the last 500
+# 1m / 300 15m bars, so writing every STORE_FLUSH seconds loses nothing and spares
+# rewriting a month's partition each minute. Bars still forming and bars
+# check_candles made up are not stored.
+INGEST_MODE = os.environ.get("ORB_INGEST", "on-demand") == "background"
+INGEST_INTERVAL = 60
+INGEST_OFFSET = float(os.environ.get("ORB_INGEST_OFFSET", 2))
+STORE_FLUSH = 15 * 60
+SNAPSHOT_KINDS = ("scan", "scan_variants", "debug")
+SNAPSHOTS = {}
+INGEST = {}
+SHARD_PROCS = []
+_shard_owner = None
+_persisted = {}
+
+def next_bar_close(now, interval=INGEST_INTERVAL, offset=INGEST_OFFSET):
+    return (now // interval + 1) * interval + offset
+
+# Which assets a tick refreshes, and in what order. Each asset gets a phase from its
+# calendar and last scan: a phase sets how often it needs fresh bars and its rank
+# (lower is served first). Due assets are ordered by (rank less the refreshes it
+# has missed, seconds to its next session open or window start, -age), so a
+# deferred asset climbs each tick. Refreshes spend CALLS_PER_REFRESH tokens from
+# the shared UPSTREAM budget (see SCRAPER), and whatever the budget doesn't reach
+# before the next bar waits for the next tick. Assets that are not refreshed are
+# still re-scanned from their cached bars, so states and session progress stay current.
+BOUNDARY_LEAD = 120
+REFRESH_PHASES = {
+    # phase: (refresh every n seconds, rank)
+    "FORMING": (60, 0),      # opening range being built
+    "WINDOW": (60, 0),       # inside a scoring window
+    "BOUNDARY": (60, 0),     # session open or window start within BOUNDARY_LEAD
+    "POSITION": (60, 1),     # a tracked position is waiting on fill/target/stop
+    "SCANNING": (60, 1),     # open, no signal yet: a breakout changes the decision
+    "LOCKED": (300, 3),      # open, today's signal already taken
+    "PRE_MARKET": (300, 4),
+    "CLOSED": (900, 5),
+}
+
+class RefreshScheduler:
+    def __init__(self, bucket=UPSTREAM):
+        self.bucket = bucket; self.last = {}; self.phases = {}
+
+    def phase(self, asset, ts):
+        cal = calendar_for(asset, ts); state, day, s_open, s_close, note = cal.segment(ts)
+        if state == "FORMING": return "FORMING", 0
+        if state == "OPEN":
+            if cal.window_at(ts): return "WINDOW", 0
+            lead = cal.next_window_start(ts) - ts
+            if lead <= BOUNDARY_LEAD: return "BOUNDARY", lead
+            if any(p["asset"] == asset for p in POSITIONS.open.values()): return "POSITION", lead
+            status = SNAPSHOTS.get(asset, {}).get("scan", {}).get("status")
+            return ("LOCKED" if status in ("TRADE","SKIP") else "SCANNING"), lead
+        if state == "PRE_MARKET":
+            lead = s_open - ts
+            return ("BOUNDARY" if lead <= BOUNDARY_LEAD else "PRE_MARKET"), lead
+        return "CLOSED", float("inf")
+
+    def plan(self, assets, ts):
+        # -> [(asset, phase)] due for a refresh, most urgent first
+        due = []
+        for asset in assets:
+            phase, lead = self.phase(asset, ts); self.phases[asset] = phase
+            every, rank = REFRESH_PHASES[phase]
+            age = ts - self.last[asset] if asset in self.last else every
+            if age < every - INGEST_OFFSET: continue
+            missed = min(rank, int(age // every) - 1)
+            due.append(((rank - missed, lead, -age), asset, phase))
+        due.sort()
+        return [(asset, phase) for _, asset, phase in due]
+
+    async def admit(self, deadline):
+        return self.bucket is None or await self.bucket.acquire(CALLS_PER_REFRESH, deadline)
+
+SCHEDULER = RefreshScheduler()
+
+def publish(asset, scraped, t0, **status):
+    full = run_scan(asset, scraped, variants=True); track(asset, full, scraped)
+    SNAPSHOTS[asset] = {"scan":{k:v for k,v in full.items() if k!="variants"},"scan_variants":full,
+        "debug":debug_asset(asset, scraped),"updated":time.time()}
+    INGEST[asset] = {"ok":scraped["status"]=="OK","error":scraped.get("error"),"count":scraped.get("candle_count",0),
+        "updated":datetime.now(TZ).isoformat(),"took_ms":round((time.time()-t0)*1000,1),**status}
+    if SHARDS > 1:
+        CACHE.set(f"snapshot:{asset}", {**{k: dumps(SNAPSHOTS[asset][k]) for k in SNAPSHOT_KINDS},"ingest":INGEST[asset]})
+
+def persist(asset, scraped, now):
+    # refreshed bars -> candle store, at most every STORE_FLUSH seconds per asset
+    if scraped["status"] != "OK" or scraped.get("stale") or now - _persisted.get(asset, 0) < STORE_FLUSH: return
+    store = store_for(asset); symbol = CONFIGS[asset]["symbol"]; report = scraped.get("quality")
+    try:
+        if report is not None:
+            c1 = scraped["candles"]; rec = c1.rec[~filled_mask(c1, report)]
+            store.write(symbol, "1", rec[rec["t"] + 60 <= now])
+        c15 = scraped.get("candles15")
+        if c15: store.write(symbol, "15", c15.rec[c15.t + 900 <= now])
+        _persisted[asset] = now
+    except OSError as e: metric_inc("store_errors"); metric_set("store_error", str(e))
+
+def publish_all(assets, fresh, t0):
+    for asset in assets:
+        try:
+            # not refreshed this tick: re-scan the last scrape
+            scraped = fresh.get(asset) or CACHE.get(asset, ttl=float("inf"))
+            if not scraped: continue
+            if asset in fresh: persist(asset, scraped, t0)
+            publish(asset, scraped, t0, phase=SCHEDULER.phases.get(asset), refreshed=asset in fresh,
+                age_s=round(max(0, t0 - SCHEDULER.last.get(asset, t0))))
+        except Exception as e: INGEST[asset] = {**INGEST.get(asset,{}),"ok":False,"error":str(e)}
+
+async def ingest_tick(assets):
+    t0 = time.time(); deadline = next_bar_close(t0) - INGEST_OFFSET
+    plan = SCHEDULER.plan(assets, t0); gate = asyncio.Semaphore(FETCH_CONCURRENCY); tasks = {}
+    async def one(asset):
+        # admit already paid for this refresh's first CALLS_PER_REFRESH calls
+        prepaid = [CALLS_PER_REFRESH]; UPSTREAM_PREPAID.set(prepaid)
+        try:
+            async with gate: return await ascrape_asset(asset)
+        finally:
+            if SCHEDULER.bucket and prepaid[0] > 0: SCHEDULER.bucket.give(prepaid[0])
+    for asset, phase in plan:
+        # launched in priority order; stop once the budget can't cover another before the next bar
+        if not await SCHEDULER.admit(deadline): break
+        SCHEDULER.last[asset] = time.time(); tasks[asset] = asyncio.ensure_future(one(asset))
+    fresh = dict(zip(tasks, await asyncio.gather(*tasks.values())))
+    metric_inc("ingest_refreshed", len(fresh)); metric_inc("ingest_deferred", len(plan) - len(fresh))
+    await asyncio.to_thread(publish_all, assets, fresh, t0)
+
+async def ingest_loop(assets, interval=INGEST_INTERVAL):
+    ALERTS.start()
+    while True:
+        try: await ingest_tick(assets)
+        except Exception as e:
+            for asset in assets: INGEST[asset] = {**INGEST.get(asset,{}),"ok":False,"error":str(e)}
+        await asyncio.sleep(max(0, next_bar_close(time.time(), interval) - time.time()))
+
+def start_ingestion():
+    if SHARDS == 1: return [asyncio.create_task(ingest_loop(list(CONFIGS)))]
+    start_shards(); return []
+
+def start_shards():
+    global _shard_owner
+    if not isinstance(CACHE, FileCache):
+        raise RuntimeError("ORB_SHARDS > 1 needs a shared cache: ORB_CACHE_BACKEND=file or shm")
+    # every uvicorn worker runs the lifespan; whoever takes the flock owns the shards
+    f = open(os.path.join(CACHE.root, "shards.lock"), "a")
+    try:
+        if fcntl: fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError: f.close(); return
+    _shard_owner = f
+    import multiprocessing
+    ctx = multiprocessing.get_context("spawn")
+    for k in range(SHARDS):
+        proc = ctx.Process(target=run_shard, args=(k,), name=f"orb-shard-{k}", daemon=True)
+        proc.start(); SHARD_PROCS.append(proc)
+
+def stop_shards():
+    for proc in SHARD_PROCS: proc.terminate()
+    for proc in SHARD_PROCS: proc.join(5)
+    SHARD_PROCS.clear()
+
+def run_shard(k):
+    asyncio.run(ingest_loop(shard_assets(k)))
+
+def shard_snapshot(asset):
+    return CACHE.get(f"snapshot:{asset}", ttl=3*INGEST_INTERVAL)
+
+def snapshot_fragments(kind):
+    # -> {asset: serialized JSON}. Never calls the scraper, that is ingestion's budget:
+    # an asset without a current snapshot (deferred, first tick still running, shard
+    # down) gets its last snapshot however old, else a scan of its last cached bars,
+    # else PENDING
+    out = {}
+    for asset in CONFIGS:
+        if SHARDS > 1:
+            snap = shard_snapshot(asset) or CACHE.get(f"snapshot:{asset}", ttl=float("inf"))
+            if snap: out[asset] = snap[kind]; continue
+        elif asset in SNAPSHOTS:
+            out[asset] = fragment((kind,asset), SNAPSHOTS[asset][kind]); continue
+        scraped = CACHE.get(asset, ttl=float("inf"))
+        if not scraped:
+            r = {"asset":asset,"symbol":CONFIGS[asset]["symbol"],"status":"PENDING","message":"Waiting for the first refresh"}
+        elif kind == "debug": r = debug_asset(asset, scraped)
+        else: r = run_scan(asset, scraped, variants=kind=="scan_variants")
+        out[asset] = fragment((kind,asset), r)
+    return out
+
+def ingest_status():
+    if SHARDS == 1: return INGEST
+    snaps = {a: shard_snapshot(a) for a in CONFIGS}
+    return {a: snap["ingest"] for a, snap in snaps.items() if snap}
+
+# ═══════════════════════════════════════════════
+# MODEL REGISTRY
+# ═══════════════════════════════════════════════
+# Artifacts load lazily on first prediction with joblib mmap_mode='r' (arrays are
+# mapped, not copied) and stay cached per (version, sha256). activate() swaps the
+# served version in place; only orb_model_*.joblib files in MODEL_DIR are accepted.
+# POST /api/model needs ORB_ADMIN_TOKEN as a bearer token (unset = disabled). It
+# writes the version to ORB_MODEL_ACTIVE, which every worker and shard process on
+# the host checks at most every MODEL_POLL seconds, so they all switch; the file
+# outlives restarts, ORB_MODEL_VERSION is only the default until then.
+MODEL_DIR = os.environ.get("ORB_MODEL_DIR", ROOT)
+MODEL_VERSION = os.environ.get("ORB_MODEL_VERSION", "v1")
+MODEL_ACTIVE = os.environ.get("ORB_MODEL_ACTIVE", os.path.join(tempfile.gettempdir(), "orb-model-active"))
+MODEL_POLL = 1.0
+ADMIN_TOKEN = os.environ.get("ORB_ADMIN_TOKEN", "")
+
+def model_path(version):
+    if not re.fullmatch(r"v\d+[\w.-]*", version): raise ValueError(f"Bad model version: {version}")
+    return os.path.join(MODEL_DIR, f"orb_model_{version}.joblib")
+
+class ModelRegistry:
+    def __init__(self, version=MODEL_VERSION, shared=MODEL_ACTIVE):
+        self.version = version; self.models = {}; self.active = None; self.lock = threading.Lock()
+        self.shared = shared; self.checked = 0; self.stamp = None
+
+    def load(self, version):
+        path = model_path(version)
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""): h.update(chunk)
+        digest = h.hexdigest()[:16]
+        key = (version, digest)
+        with self.lock:
+            if key in self.models: return key
+            t0 = time.time()
+            if ROOT not in sys.path: sys.path.insert(0, ROOT)
+            import joblib, orb_model
+            # v1 was pickled from a notebook, so it refers to __main__.ORBModel
+            main = sys.modules["__main__"]
+            if not hasattr(main, "ORBModel"): main.ORBModel = orb_model.ORBModel
+            self.models[key] = joblib.load(path, mmap_mode="r")
+            metric_time("model_load", time.time() - t0)
+            metric_set("model_loaded", f"{version}@{digest}")
+            return key
+
+    def activate(self, version, publish=False):
+        key = self.load(version)
+        if publish and self.shared:
+            tmp = f"{self.shared}.{os.getpid()}.tmp"
+            with open(tmp, "w") as f: f.write(version)
+            os.replace(tmp, self.shared); self.stamp = os.stat(self.shared).st_mtime_ns
+        self.active = key; self.version = version
+        return key
+
+    def follow(self):
+        # switch to the version another process published, if it changed
+        now = time.monotonic()
+        if not self.shared or now - self.checked < MODEL_POLL: return
+        self.checked = now
+        try:
+            stamp = os.stat(self.shared).st_mtime_ns
+            if stamp == self.stamp: return
+            with open(self.shared) as f: version = f.read().strip()
+        except OSError: return
+        self.stamp = stamp
+        if version and version != self.version:
+            try: self.activate(version)
+            except (OSError, ValueError) as e: metric_set("model_error", str(e))
+
+    def get(self):
+        self.follow()
+        if self.active is None: self.activate(self.version)
+        return self.models[self.active]
+
+    def info(self):
+        self.follow()
+        return {"active":"@".join(self.active) if self.active else None,"version":self.version,
+            "cached":["@".join(k) for k in self.models]}
+
+MODELS = ModelRegistry()
+
+# ═══════════════════════════════════════════════
+# JSON ENCODING
+# ═══════════════════════════════════════════════
+# orjson when installed, compact stdlib json otherwise. Per-asset results are
+# encoded once and reused while the same object is served (ingest snapshots live
+# for a tick), and responses are stitched together from those byte fragments.
+# On-demand scans build a new result each poll, stamped to the second, so they are
+# simply encoded: comparing them with the last one would cost about as much.
+FRAGMENTS = {}
+
+def _json_default(o):
+    if type(o).__module__ != "numpy": raise TypeError(f"{type(o).__name__} is not JSON serializable")
+    if isinstance(o, np.integer): return int(o)
+    if isinstance(o, np.floating): return float(o)
+    if isinstance(o, np.ndarray): return o.tolist()
+    raise TypeError(f"{type(o).__name__} is not JSON serializable")
+
+def dumps(obj):
+    if orjson: return orjson.dumps(obj, default=_json_default, option=orjson.OPT_SERIALIZE_NUMPY|orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, separators=(",",":"), default=_json_default).encode("utf-8")
+
+def fragment(key, obj):
+    hit = FRAGMENTS.get(key)
+    if hit and hit[0] is obj: return hit[1]
+    raw = dumps(obj); FRAGMENTS[key] = (obj, raw)
+    return raw
+
+def join_fragments(parts):
+    return b"{" + b",".join(dumps(str(k)) + b":" + v for k, v in parts.items()) + b"}"
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+    def render(self, content):
+        return content if isinstance(content, (bytes, bytearray)) else dumps(content)
+
 # ═══════════════════════════════════════════════
 # API
 # ═══════════════════════════════════════════════
+def debug_asset(asset, d):
+    config = CONFIGS[asset]; session_tz = SESSION_TZ[asset]
+    now_s = datetime.now(pytz.UTC).astimezone(session_tz); today_str = now_s.strftime("%Y-%m-%d")
+    ac = d.get("candles") or EMPTY_CANDLES; tc = ac.session(today_str)
+    orc = tc.between(config["range_start"], config["range_end"])
+    pc = tc.between(config["post_range_start"])
+    return {"status":d["status"],"source":d.get("source"),"error":d.get("error"),
+        "ma50":d.get("ma50"),"ma200":d.get("ma200"),"price":d.get("price"),
+        "total_candles":len(ac),"today_candles":len(tc),"or_candles":len(orc),
+        "post_candles":len(pc),"session_date":today_str,"session_time":now_s.strftime("%H:%M:%S %Z"),
+        "range_window":f"{config['range_start']}-{config['range_end']}",
+        "first_or":orc[0].to_dict() if orc else None,"last_or":orc[-1].to_dict() if orc else None,
+        "quality":scan_quality(d.get("quality"), tc, orc, config)}
+
+def scan_all(scraped, variants=False):
+    results = {asset: run_scan(asset, scraped[asset], variants=variants) for asset in CONFIGS}
+    for asset, r in results.items(): track(asset, r, scraped[asset])
+    return results
+
+# Handlers that wait on the scraper are async; scans (CPU) and snapshot fallbacks
+# (which may scrape synchronously) run in worker threads.
 @app.get("/api/scan")
-def api_scan():
-    scraped = scrape_all()
-    return JSONResponse({asset: run_scan(asset, scraped[asset]) for asset in CONFIGS})
+async def api_scan(variants: bool = False):
+    kind = "scan_variants" if variants else "scan"; ALERTS.start()
+    if INGEST_MODE: return FastJSONResponse(join_fragments(await asyncio.to_thread(snapshot_fragments, kind)))
+    results = await asyncio.to_thread(scan_all, await ascrape_all(), variants)
+    return FastJSONResponse(join_fragments({a: fragment((kind,a), r) for a, r in results.items()}))
+
+@app.post("/api/scan/batch")
+def api_scan_batch(payload: dict):
+    jobs = payload.get("jobs") or []
+    if not isinstance(jobs, list) or not all(isinstance(j, dict) for j in jobs):
+        return JSONResponse({"error":"jobs must be a list of objects"}, status_code=400)
+    try:
+        workers = int(payload.get("workers") if payload.get("workers") is not None else BATCH_WORKERS)
+        chunksize = int(payload.get("chunksize") if payload.get("chunksize") is not None else BATCH_CHUNK)
+        if workers < 1 or chunksize < 1: raise ValueError("must be >= 1")
+    except (TypeError, ValueError) as e: return JSONResponse({"error":f"Bad workers/chunksize: {e}"}, status_code=400)
+    workers = min(workers, BATCH_WORKERS)
+    metric_inc("batch_jobs", len(jobs))
+    results = scan_batch(jobs, workers, chunksize, ordered=payload.get("ordered", True))
+    if payload.get("record"): results = recorded(results)
+    return StreamingResponse((dumps(r) + b"\n" for r in results), media_type="application/x-ndjson")
+
+def recorded(results):
+    # replays into the signal history; blocks on a full queue instead of dropping
+    for r in results:
+        if r.get("asset") in CONFIGS: SIGNALS.record(r["asset"], r, block=True)
+        yield r
 
 @app.get("/api/debug")
-def api_debug():
-    scraped = scrape_all(); debug = {}
-    for asset, d in scraped.items():
-        config = CONFIGS[asset]; session_tz = pytz.timezone(config["session_tz"])
-        now_s = datetime.now(pytz.UTC).astimezone(session_tz); today_str = now_s.strftime("%Y-%m-%d")
-        ac = d.get("candles",[]); tc = [c for c in ac if c.get("date_et")==today_str]
-        orc = [c for c in tc if config["range_start"]<=c.get("time_hhmm_et",0)<=config["range_end"]]
-        pc = [c for c in tc if c.get("time_hhmm_et",0)>=config["post_range_start"]]
-        debug[asset] = {"status":d["status"],"source":d.get("source"),"error":d.get("error"),
-            "ma50":d.get("ma50"),"ma200":d.get("ma200"),"price":d.get("price"),
-            "total_candles":len(ac),"today_candles":len(tc),"or_candles":len(orc),
-            "post_candles":len(pc),"session_date":today_str,"session_time":now_s.strftime("%H:%M:%S %Z"),
-            "range_window":f"{config['range_start']}-{config['range_end']}",
-            "first_or":orc[0] if orc else None,"last_or":orc[-1] if orc else None}
-    debug["_config"] = {"scraper_url":SCRAPER_URL,"display_tz":str(TZ)}
-    return JSONResponse(debug)
+async def api_debug():
+    if INGEST_MODE: parts = await asyncio.to_thread(snapshot_fragments, "debug")
+    else: parts = {asset: fragment(("debug",asset), debug_asset(asset, d)) for asset, d in (await ascrape_all()).items()}
+    parts["_config"] = dumps({"scraper_url":SCRAPER_URL,"display_tz":str(TZ),"ingest":"background" if INGEST_MODE else "on-demand",
+        "assets":len(CONFIGS),"shards":SHARDS})
+    return FastJSONResponse(join_fragments(parts))
 
 @app.get("/api/scraper-test")
-def api_scraper_test():
+async def api_scraper_test():
+    if INGEST_MODE:
+        ingest = await asyncio.to_thread(ingest_status); ok = all(ingest.get(a,{}).get("ok") for a in CONFIGS)
+        return JSONResponse({"status":"OK" if ok else "PARTIAL","scraper_url":SCRAPER_URL,"ingest":ingest})
+    fetched = await asyncio.gather(*(afetch_candles(cfg["symbol"], "1", 5) for cfg in CONFIGS.values()))
     results = {}
-    for asset, cfg in CONFIGS.items():
-        c, err = fetch_candles(cfg["symbol"], "1", 5)
+    for (asset, cfg), (c, err) in zip(CONFIGS.items(), fetched):
         results[asset] = {"symbol":cfg["symbol"],"success":len(c)>0,"count":len(c),"error":err,
-            "sample":c[:2] if c else None,"has_et":c[0].get("time_et") is not None if c else False}
+            "sample":c[:2].to_dicts() if c else None,"has_et":c[0].get("time_et") is not None if c else False}
     ok = all(r["success"] for r in results.values())
     return JSONResponse({"status":"OK" if ok else "PARTIAL","scraper_url":SCRAPER_URL,"results":results})
 
+@app.post("/api/predict")
+def api_predict(payload: dict):
+    setups = payload.get("setups", payload)
+    try: model = MODELS.get()
+    except (OSError, ValueError) as e: return JSONResponse({"error":f"Model unavailable: {e}"}, status_code=503)
+    t0 = time.time()
+    try: scores = model.score_batch(setups)
+    except (KeyError, TypeError, ValueError) as e: return JSONResponse({"error":f"Bad setups: {e}"}, status_code=400)
+    metric_time("predict", time.time() - t0); metric_inc("predict_rows", len(scores))
+    return FastJSONResponse({"model":"@".join(MODELS.active),"count":len(scores),"results":scores})
+
+@app.get("/api/model")
+def api_model():
+    return MODELS.info()
+
+@app.post("/api/model")
+def api_model_activate(payload: dict, request: Request):
+    if not ADMIN_TOKEN: return JSONResponse({"error":"Model switching disabled (ORB_ADMIN_TOKEN)"}, status_code=403)
+    auth = request.headers.get("authorization", "").encode()
+    if not hmac.compare_digest(auth, f"Bearer {ADMIN_TOKEN}".encode()): return JSONResponse({"error":"Unauthorized"}, status_code=401)
+    try: MODELS.activate(str(payload.get("version", "")), publish=True)
+    except (OSError, ValueError) as e: return JSONResponse({"error":str(e)}, status_code=400)
+    return MODELS.info()
+
+@app.get("/api/positions")
+def api_positions(asset: str = None, limit: int = 100):
+    if asset and asset not in CONFIGS: return JSONResponse({"error":f"Unknown asset: {asset}"}, status_code=404)
+    return FastJSONResponse(POSITIONS.snapshot(asset, max(1, min(limit, 1000))))
+
+@app.get("/api/signals")
+def api_signals(asset: str = None, status: str = None, direction: str = None, confidence: str = None,
+        day: str = None, window: str = None, since: str = None, until: str = None,
+        limit: int = 100, cursor: str = None, transitions: bool = False):
+    # comma-separated values per filter; since/until are session dates, inclusive
+    if not SIGNALS.path: return JSONResponse({"error":"Signal history disabled (ORB_SIGNALS)"}, status_code=503)
+    raw = {"asset":asset,"status":status,"direction":direction,"confidence":confidence,"day":day,"window":window}
+    filters = {k: [x.strip() for x in v.split(",") if x.strip()] for k, v in raw.items() if v}
+    for k in ("asset","status","direction","confidence"):
+        if k in filters: filters[k] = [x.upper() for x in filters[k]]
+    if "day" in filters: filters["day"] = [x.capitalize() for x in filters["day"]]
+    unknown = [a for a in filters.get("asset", []) if a not in CONFIGS]
+    if unknown: return JSONResponse({"error":f"Unknown asset: {','.join(unknown)}"}, status_code=404)
+    for k, allowed in SIGNAL_VALUES.items():
+        bad = [x for x in filters.get(k, []) if x not in allowed]
+        if bad: return JSONResponse({"error":f"Bad {k}: {','.join(bad)} (one of {','.join(allowed)})"}, status_code=400)
+    try:
+        for d in (since, until):
+            if d: datetime.strptime(d, "%Y-%m-%d")
+        if cursor and transitions: int(cursor)
+    except ValueError as e: return JSONResponse({"error":f"Bad query: {e}"}, status_code=400)
+    t0 = time.time()
+    try: found = SIGNALS.query(filters, since, until, max(1, min(limit, 1000)), cursor, transitions)
+    except (OSError, sqlite3.Error) as e: return JSONResponse({"error":f"Signal history unavailable: {e}"}, status_code=503)
+    metric_time("signals_query", time.time() - t0)
+    return FastJSONResponse(found)
+
+@app.get("/api/metrics")
+def api_metrics():
+    return FastJSONResponse({**METRICS,"model":MODELS.info(),"circuits":{h:b.info() for h,b in BREAKERS.items()},
+        "signals":SIGNALS.info(),"alerts":ALERTS.info()})
+
 @app.get("/api/health")
-def health():
+async def health():
     scraper_ok = False
-    try: http_get(f"{SCRAPER_URL}/api/health"); scraper_ok = True
-    except: pass
-    return {"status":"ok","time":datetime.now(TZ).isoformat(),"scraper_connected":scraper_ok}
+    if INGEST_MODE: scraper_ok = any(i.get("ok") for i in (await asyncio.to_thread(ingest_status)).values())
+    else:
+        try: await ahttp_get(f"{SCRAPER_URL}/api/health"); scraper_ok = True
+        except: pass
+    return {"status":"ok","time":datetime.now(TZ).isoformat(),"scraper_connected":scraper_ok,
+        "circuits":{h:b.info() for h,b in BREAKERS.items()}}
 
 # ═══════════════════════════════════════════════
 # ADVANCED RESPONSIVE UI
 # ═══════════════════════════════════════════════
+# Rendered once, on first hit: identity, gzip and (if installed) brotli bodies plus a
+# content-hash ETag. Browsers revalidate hourly and get 304s; CDN edges keep it
+# for a year since every deploy purges the edge cache anyway.
+PAGE_CACHE_CONTROL = "public, max-age=3600, s-maxage=31536000, stale-while-revalidate=86400"
+
+def build_page(html):
+    raw = html.encode("utf-8"); digest = hashlib.sha256(raw).hexdigest()[:20]
+    bodies = {"identity": raw, "gzip": gzip.compress(raw, 9, mtime=0)}
+    if brotli: bodies["br"] = brotli.compress(raw, quality=11)
+    return {enc: (body, f'"{digest}-{enc}"') for enc, body in bodies.items()}, digest
+
+def pick_encoding(accept, available):
+    offered = {}
+    for part in (accept or "").split(","):
+        name, _, params = part.strip().partition(";")
+        q = params.strip()[2:] if params.strip().startswith("q=") else "1"
+        try: offered[name.strip().lower()] = float(q)
+        except ValueError: continue
+    for enc in ("br", "gzip"):
+        if enc in available and offered.get(enc, offered.get("*", 0)) > 0: return enc
+    return "identity"
+
 @app.get("/", response_class=HTMLResponse)
-def home():
-    return """<!DOCTYPE html>
+def home(request: Request):
+    bodies, digest = page()
+    enc = pick_encoding(request.headers.get("accept-encoding"), bodies)
+    body, etag = bodies[enc]
+    headers = {"ETag": etag, "Cache-Control": PAGE_CACHE_CONTROL, "Vary": "Accept-Encoding"}
+    if digest in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    if enc != "identity": headers["Content-Encoding"] = enc
+    return Response(body, media_type="text/html; charset=utf-8", headers=headers)
+
+DASHBOARD_HTML = """<!DOCTYPE html>
 <html lang="en">
 <head>
 <meta charset="UTF-8">
@@ -1027,4 +2936,11 @@ setInterval(ck,1000);
 .fvg-icon{width:clamp(40px,36px + 1vw,52px);height:clamp(28px,24px + .7vw,36px);flex-shrink:0}
 </style>
 </body>
-</html>"""
\ No newline at end of file
+</html>"""
+
+_page = None
+
+def page():
+    global _page
+    if _page is None: _page = build_page(DASHBOARD_HTML)
+    return _page
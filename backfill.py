@@ -0,0 +1,178 @@
+"""Resumable historical backfill from the scraper into the on-disk candle store.
+
+History for each CONFIGS symbol and interval is split into segments on a fixed
+grid from the epoch. Each segment is paged backwards from its end with the
+scraper's ``to`` bound, so segments fill concurrently on a bounded worker pool
+and all workers share one request-rate budget. Progress is checkpointed per
+segment, so an interrupted run picks up where it stopped, also when resumed with
+a later ``--until``. The store deduplicates bars on write, so overlapping pages
+and re-runs are harmless. With ``ORB_SHARDS`` set, bars go to each asset's shard
+store, and ``--shard`` fills one shard, so shards can be backfilled by separate
+processes::
+
+    python backfill.py --since 2024-01-01 --intervals 1,15 --workers 8 --rate 10
+    python backfill.py --since 2024-01-01 --assets GOLD --store /data/candles
+    ORB_SHARDS=4 python backfill.py --since 2024-01-01 --shard 2
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+
+from api.index import CONFIGS, BREAKERS, SHARDS, CandleStore, TokenBucket, fetch_candles, shard_assets, store_for
+
+PAGE = 500
+SEGMENT_DAYS = {'1': 7, '5': 30, '15': 90, '60': 365}
+MAX_RETRIES = 8
+
+
+class Checkpoint:
+    """Per-segment cursors in ``<store>/_backfill.json``, rewritten atomically."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        try:
+            with open(path) as f:
+                self.state = json.load(f)
+        except FileNotFoundError:
+            self.state = {}
+
+    def get(self, key):
+        return self.state.get(key, {})
+
+    def update(self, key, **fields):
+        with self.lock:
+            self.state[key] = {**self.state.get(key, {}), **fields}
+            tmp = f'{self.path}.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(self.state, f, indent=1, sort_keys=True)
+            os.replace(tmp, self.path)
+
+
+def segments(since, until, interval):
+    # a fixed grid of span-long segments counted from the epoch, so a segment (and its
+    # checkpoint) stays put whatever --since/--until a run uses; the outer ones are clipped
+    span = SEGMENT_DAYS.get(interval, 30) * 86400
+    start = since // span * span
+    while start < until:
+        yield start, max(since, start), min(until, start + span)
+        start += span
+
+
+def segment_key(job):
+    asset, _, interval, start = job[:4]
+    return f'{asset}|{interval}|{start}'
+
+
+def segment_done(state, lo, hi):
+    # filled down to lo (or to where history starts) and up to hi
+    return bool(state.get('done')) and state.get('floor', lo) <= lo and state.get('top', hi) >= hi
+
+
+def page_down(job, lo, cursor, store, bucket, on_page=None):
+    # fills [lo, cursor) newest page first; -> (pages, bars added, lowest cursor reached)
+    asset, symbol, interval = job[:3]
+    pages = added = retries = 0
+    while cursor > lo:
+        bucket.wait()
+        candles, err = fetch_candles(symbol, interval, PAGE, end=cursor - 1)
+        if err and err.startswith('Scraper unreachable'):
+            retries += 1
+            if retries > MAX_RETRIES:
+                raise RuntimeError(f'{segment_key(job)}: {err}')
+            # wait out an open circuit, otherwise back off exponentially
+            wait = max((b.retry_in() for b in BREAKERS.values()), default=0)
+            time.sleep(max(wait, min(60, 2 ** retries)))
+            continue
+        retries = 0
+        if not len(candles) or int(candles.t[0]) >= cursor:
+            break
+        if int(candles.t[-1]) >= cursor:
+            raise RuntimeError(f'{segment_key(job)}: scraper ignored the "to" bound, cannot page backwards')
+        keep = candles.rec[candles.t >= lo]
+        added += store_for(asset, store).write(symbol, interval, keep)
+        pages += 1
+        cursor = int(candles.t[0])
+        if on_page:
+            on_page(cursor)
+        if len(candles) < PAGE:
+            break
+    return pages, added, cursor
+
+
+def fill_segment(job, store, bucket, checkpoint):
+    lo, hi = job[4:]
+    key = segment_key(job)
+    state = checkpoint.get(key)
+    if segment_done(state, lo, hi):
+        return key, 0, 0
+    pages = added = 0
+    top = state.get('top', hi)
+    if top < hi:
+        # a later --until: the bars above what the last run reached
+        pages, added, _ = page_down(job, top, hi, store, bucket)
+    checkpoint.update(key, top=max(top, hi))
+    if not (state.get('done') and state.get('floor', lo) <= lo):
+        p, a, cursor = page_down(job, lo, state.get('cursor', hi), store, bucket,
+                                 lambda c: checkpoint.update(key, cursor=c))
+        pages += p
+        added += a
+        checkpoint.update(key, cursor=cursor, floor=min(lo, state.get('floor', lo)), done=True)
+    return key, pages, added
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--since', required=True, help='oldest date to fill, YYYY-MM-DD (UTC)')
+    ap.add_argument('--until', default=None, help='newest date, YYYY-MM-DD (default: now)')
+    ap.add_argument('--assets', default=','.join(CONFIGS))
+    ap.add_argument('--intervals', default='1,15')
+    ap.add_argument('--workers', type=int, default=4)
+    ap.add_argument('--rate', type=float, default=5.0, help='scraper requests per second, all workers')
+    ap.add_argument('--store', default=None)
+    ap.add_argument('--shard', type=int, default=None, help=f'only the assets of this shard (0..{SHARDS - 1})')
+    args = ap.parse_args()
+
+    to_epoch = lambda d: int(datetime.strptime(d, '%Y-%m-%d').replace(tzinfo=timezone.utc).timestamp())
+    since = to_epoch(args.since)
+    until = to_epoch(args.until) if args.until else int(time.time()) // 60 * 60
+    store = CandleStore(args.store)
+    os.makedirs(store.root, exist_ok=True)
+    checkpoint = Checkpoint(os.path.join(store.root, '_backfill.json'))
+    bucket = TokenBucket(args.rate)
+
+    jobs = [(asset, CONFIGS[asset]['symbol'], interval, start, lo, hi)
+            for asset in args.assets.split(',')
+            if args.shard is None or asset in shard_assets(args.shard)
+            for interval in args.intervals.split(',')
+            for start, lo, hi in segments(since, until, interval)]
+    todo = [j for j in jobs if not segment_done(checkpoint.get(segment_key(j)), *j[4:])]
+    print(f'{len(jobs)} segments, {len(jobs) - len(todo)} already done, {len(todo)} to fill', flush=True)
+
+    t0 = time.time()
+    total_pages = total_added = failed = 0
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        futures = [pool.submit(fill_segment, j, store, bucket, checkpoint) for j in todo]
+        for n, f in enumerate(as_completed(futures), 1):
+            try:
+                key, pages, added = f.result()
+            except Exception as e:
+                failed += 1
+                print(f'  failed: {e}', file=sys.stderr, flush=True)
+                continue
+            total_pages += pages
+            total_added += added
+            print(f'  [{n}/{len(todo)}] {key}: {pages} pages, +{added} bars', flush=True)
+    took = time.time() - t0
+    print(f'done in {took:.1f}s: {total_pages} requests ({total_pages / max(took, 1e-9):.1f}/s), '
+          f'+{total_added} bars, {failed} failed segments')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
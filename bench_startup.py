@@ -0,0 +1,92 @@
+"""Cold-start benchmark for the serverless entry point.
+
+Imports ``api.index`` in fresh interpreters with ``-X importtime`` and
+summarizes where the time goes::
+
+    python bench_startup.py                 # 5 runs, top 15 modules
+    python bench_startup.py --budget-ms 450 # exit 1 when the median exceeds it
+    python bench_startup.py --json          # machine-readable report for CI
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def profile_once(target, env=None):
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {target}'],
+        cwd=ROOT, capture_output=True, text=True, env={**os.environ, **(env or {})},
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cum_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cum_us), depth))
+    return rows
+
+
+def summarize(runs, target, top):
+    totals = [next(cum for name, _, cum, _ in rows if name == target) / 1000 for rows in runs]
+    by_self, by_pkg = {}, {}
+    for rows in runs:
+        # children are printed before their parent, so the target's subtree is
+        # everything after the previous top-level line
+        end = next(i for i, row in enumerate(rows) if row[0] == target)
+        start = max((i for i, row in enumerate(rows[:end]) if row[3] == 0), default=-1) + 1
+        for name, self_us, cum_us, depth in rows[start:end + 1]:
+            by_self.setdefault(name, []).append(self_us / 1000)
+            if depth == 1:
+                pkg = name.split('.')[0]
+                by_pkg[pkg] = by_pkg.get(pkg, 0) + cum_us / 1000
+    mean_self = {k: sum(v) / len(runs) for k, v in by_self.items()}
+    pkgs = {k: v / len(runs) for k, v in by_pkg.items()}
+    return {
+        'target': target,
+        'runs': len(runs),
+        'median_ms': round(statistics.median(totals), 1),
+        'min_ms': round(min(totals), 1),
+        'max_ms': round(max(totals), 1),
+        'modules': len(runs[0]),
+        'top_self_ms': [(k, round(v, 2)) for k, v in sorted(mean_self.items(), key=lambda x: -x[1])[:top]],
+        'top_packages_ms': [(k, round(v, 1)) for k, v in sorted(pkgs.items(), key=lambda x: -x[1])[:top]],
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--target', default='api.index')
+    ap.add_argument('--runs', type=int, default=5)
+    ap.add_argument('--top', type=int, default=15)
+    ap.add_argument('--budget-ms', type=float, default=None)
+    ap.add_argument('--json', action='store_true')
+    args = ap.parse_args()
+
+    report = summarize([profile_once(args.target) for _ in range(args.runs)], args.target, args.top)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"import {report['target']}: median {report['median_ms']} ms "
+              f"(min {report['min_ms']}, max {report['max_ms']}, {report['modules']} modules, {report['runs']} runs)")
+        print('\ntop packages imported by the target (mean cumulative ms)')
+        for name, ms in report['top_packages_ms']:
+            print(f'  {ms:9.1f}  {name}')
+        print('\ntop modules (mean self ms)')
+        for name, ms in report['top_self_ms']:
+            print(f'  {ms:9.2f}  {name}')
+    if args.budget_ms is not None and report['median_ms'] > args.budget_ms:
+        print(f"\nover budget: {report['median_ms']} ms > {args.budget_ms} ms", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,236 @@
+"""Streaming feature extraction: stored candle history -> ORBModel setup tables.
+
+Sessions are read from the candle store one chunk of days at a time. Each
+session goes through the same opening-range and FVG rules as ``run_scan``:
+the same ET session dates, ET ``range_start..range_end`` and
+``post_range_start``. Every session yields at most one setup per direction,
+the first breakout bar whose three-bar window forms a valid FVG. Bars go through
+``check_candles`` first, as on every live refresh: a session whose range has
+less than ``MIN_RANGE_COVERAGE`` of its minutes as real bars yields nothing,
+and bars the check filled in never form an FVG. Sessions the calendar marks
+as a holiday yield nothing, and bars from the session close on (an early close
+where the calendar has one) are dropped, as live scans and position tracking
+stop there. Its forward outcome is then walked bar by bar to the close:
+
+* fill when price trades back to the entry
+* ``target`` or ``stop``, whichever is hit first; a bar touching both counts
+  as a stop
+* MAE and MFE, in price units, from the fill to the exit
+
+Tables are dicts of equal-length NumPy columns. They carry the fields of
+``ORBModel.score_trade`` (``range_size``, ``fvg_size``, ``candles_to_break``,
+``direction``, ``date``), so ``ORBModel().score_batch(table)`` consumes
+them directly, and ``ORBLearnedModel().partial_fit(table)`` trains on them
+chunk by chunk. ``iter_setups`` yields one table per chunk, so memory stays
+bounded by the chunk size, not by the length of the history::
+
+    python features.py --since 2024-01-01 --assets NAS100,GOLD --out setups.csv
+"""
+import argparse
+import csv
+import sys
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from api.index import (
+    CONFIGS, ET, MIN_RANGE_COVERAGE, SESSION_TZ, CandleStore, calendar_for, check_candles, filled_mask,
+    fvg_windows, hhmm_minutes, local_epoch, store_for,
+)
+
+COLUMNS = (
+    'asset', 'date', 'weekday', 'direction', 'aligned', 'ma50', 'ma200',
+    'range_high', 'range_low', 'range_size', 'fvg_size', 'candles_to_break',
+    'entry', 'stop', 'target', 'setup_time', 'fill_time', 'exit_time',
+    'outcome', 'r_multiple', 'mae', 'mfe',
+)
+OUTCOMES = ('unfilled', 'open', 'target', 'stop')
+CHUNK_DAYS = 31
+
+
+def empty_table():
+    return {k: [] for k in COLUMNS}
+
+
+def to_columns(rows):
+    return {k: np.asarray(v) for k, v in rows.items()}
+
+
+def concat_tables(tables):
+    tables = [t for t in tables if len(t['date'])]
+    if not tables:
+        return to_columns(empty_table())
+    return {k: np.concatenate([t[k] for t in tables]) for k in COLUMNS}
+
+
+def iter_sessions(asset, since, until, store=None, chunk_days=CHUNK_DAYS):
+    """Yield ``(date_str, session_candles, ma50, ma200, filled)`` per ET session date, one chunk in memory.
+
+    ``filled`` marks the session's bars that ``check_candles`` made up.
+    """
+    store = store_for(asset, store)
+    symbol = CONFIGS[asset]['symbol']
+    day = since
+    while day < until:
+        stop = min(until, day + timedelta(days=chunk_days))
+        start_ts, end_ts = local_epoch(ET, day, 0), local_epoch(ET, stop, 0)
+        bars, report = check_candles(store.read(symbol, '1', start_ts, end_ts))
+        filled = filled_mask(bars, report)
+        # 15m closes from well before the chunk so the first sessions have their MAs
+        bars15 = store.read(symbol, '15', start_ts - 14 * 86400, end_ts)
+        t15, cs15 = bars15.t, np.concatenate([[0.0], np.cumsum(bars15.close)])
+        if len(bars):
+            days = bars.day_et()
+            bounds = np.flatnonzero(np.diff(days)) + 1
+            for lo, hi in zip(np.r_[0, bounds], np.r_[bounds, len(days)]):
+                date_str = datetime.fromtimestamp(int(days[lo]) * 86400, timezone.utc).strftime('%Y-%m-%d')
+                ma50, ma200 = _mas(t15, cs15, bars.t[lo])
+                yield date_str, bars[int(lo):int(hi)], ma50, ma200, filled[lo:hi]
+        day = stop
+
+
+def _mas(t15, cs15, ts):
+    # 50/200-bar means of 15m closes before ts, as scrape_asset computes them
+    n = int(np.searchsorted(t15, ts))
+    if n < 50:
+        return np.nan, np.nan
+    k = min(n, 200)
+    return (cs15[n] - cs15[n - 50]) / 50, (cs15[n] - cs15[n - k]) / k
+
+
+def session_setups(asset, date_str, session, ma50, ma200, rr=1.0, filled=None):
+    """Setups of one session as a list of row dicts (at most one per direction)."""
+    config = CONFIGS[asset]
+    hm = session.hhmm_et()
+    filled = np.zeros(len(hm), bool) if filled is None else filled
+    in_or = (hm >= config['range_start']) & (hm <= config['range_end'])
+    if not in_or.any():
+        return []
+    expected = hhmm_minutes(config['range_end']) - hhmm_minutes(config['range_start']) + 1
+    if (in_or & ~filled).sum() < config.get('min_range_coverage', MIN_RANGE_COVERAGE) * expected:
+        return []
+    close = session_close(asset, int(session.t[in_or][0]))
+    if close is None:
+        return []
+    rh = round(float(session.high[in_or].max()), 2)
+    rl = round(float(session.low[in_or].min()), 2)
+    post = (hm >= config['post_range_start']) & (session.t < close)
+    t, o, h, l, c = (session.rec[f][post] for f in ('t', 'open', 'high', 'low', 'close'))
+    if len(t) < 3:
+        return []
+    usable = fvg_windows(filled[post])
+    trend = 'LONG' if ma50 > ma200 else 'SHORT' if ma50 < ma200 else None
+    weekday = datetime.strptime(date_str, '%Y-%m-%d').strftime('%A')
+    rows = []
+    for direction in ('LONG', 'SHORT'):
+        if direction == 'LONG':
+            gap = l[2:] - h[:-2]
+            ok = (c[1:-1] > rh) & (gap > 0) & (c[1:-1] > o[1:-1]) & usable
+        else:
+            gap = l[:-2] - h[2:]
+            ok = (c[1:-1] < rl) & (gap > 0) & (c[1:-1] < o[1:-1]) & usable
+        hits = np.flatnonzero(ok)
+        if not len(hits):
+            continue
+        i = int(hits[0])
+        entry = round(float(l[i + 2] if direction == 'LONG' else h[i + 2]), 2)
+        stop = rl if direction == 'LONG' else rh
+        risk = abs(entry - stop)
+        target = round(entry + rr * risk if direction == 'LONG' else entry - rr * risk, 2)
+        outcome = forward_outcome(direction, entry, stop, target, t[i + 3:], h[i + 3:], l[i + 3:], c[i + 3:])
+        rows.append({
+            'asset': asset, 'date': date_str, 'weekday': weekday, 'direction': direction,
+            'aligned': trend == direction, 'ma50': ma50, 'ma200': ma200,
+            'range_high': rh, 'range_low': rl, 'range_size': round(rh - rl, 2),
+            'fvg_size': round(float(gap[i]), 2), 'candles_to_break': i + 1,
+            'entry': entry, 'stop': stop, 'target': target, 'setup_time': int(t[i + 2]),
+            **outcome,
+        })
+    return rows
+
+
+def session_close(asset, ts):
+    # epoch of the close of the session trading at ts, capped at the configured close
+    # like PositionTracker's expiry; None on holidays and weekends
+    state, day, _, s_close, _ = calendar_for(asset, ts).segment(ts)
+    if state in ('HOLIDAY', 'WEEKEND'):
+        return None
+    return min(s_close, local_epoch(SESSION_TZ[asset], day, CONFIGS[asset]['session_close']))
+
+
+def forward_outcome(direction, entry, stop, target, t, h, l, c):
+    long = direction == 'LONG'
+    risk = abs(entry - stop) or np.nan
+    filled = np.flatnonzero(l <= entry if long else h >= entry)
+    if not len(filled):
+        return {'fill_time': 0, 'exit_time': 0, 'outcome': 'unfilled', 'r_multiple': 0.0, 'mae': 0.0, 'mfe': 0.0}
+    f = int(filled[0])
+    n = len(t) - f
+    stop_hit = np.flatnonzero(l[f:] <= stop if long else h[f:] >= stop)
+    # the fill bar's range is ambiguous, so targets only count from the next bar
+    target_hit = np.flatnonzero(h[f + 1:] >= target if long else l[f + 1:] <= target) + 1
+    s = int(stop_hit[0]) if len(stop_hit) else n
+    g = int(target_hit[0]) if len(target_hit) else n
+    end = f + min(s, g, n - 1)
+    if s < n and s <= g:
+        outcome, r = 'stop', -1.0
+    elif g < n:
+        outcome, r = 'target', abs(target - entry) / risk
+    else:
+        outcome, r = 'open', ((c[-1] - entry) if long else (entry - c[-1])) / risk
+    hi, lo = h[f:end + 1].max(), l[f:end + 1].min()
+    mfe, mae = (hi - entry, entry - lo) if long else (entry - lo, hi - entry)
+    return {
+        'fill_time': int(t[f]), 'exit_time': int(t[end]), 'outcome': outcome,
+        'r_multiple': round(float(r), 3), 'mae': round(float(max(mae, 0)), 2), 'mfe': round(float(max(mfe, 0)), 2),
+    }
+
+
+def iter_setups(assets, since, until, store=None, chunk_days=CHUNK_DAYS, rr=1.0):
+    """Yield one columnar setup table per chunk of sessions."""
+    for asset in assets:
+        rows, pending = empty_table(), 0
+        for date_str, session, ma50, ma200, filled in iter_sessions(asset, since, until, store, chunk_days):
+            for row in session_setups(asset, date_str, session, ma50, ma200, rr, filled):
+                for k in COLUMNS:
+                    rows[k].append(row[k])
+            pending += 1
+            if pending >= chunk_days:
+                yield to_columns(rows)
+                rows, pending = empty_table(), 0
+        if rows['date']:
+            yield to_columns(rows)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--since', required=True, help='first session date, YYYY-MM-DD')
+    ap.add_argument('--until', default=None, help='last session date (exclusive), default today')
+    ap.add_argument('--assets', default=','.join(CONFIGS))
+    ap.add_argument('--store', default=None)
+    ap.add_argument('--rr', type=float, default=1.0)
+    ap.add_argument('--out', required=True, help='.csv (streamed) or .npz')
+    args = ap.parse_args()
+
+    since = datetime.strptime(args.since, '%Y-%m-%d').date()
+    until = datetime.strptime(args.until, '%Y-%m-%d').date() if args.until else datetime.now(ET).date()
+    store = CandleStore(args.store) if args.store else None
+    chunks = iter_setups(args.assets.split(','), since, until, store, rr=args.rr)
+    n = 0
+    if args.out.endswith('.npz'):
+        table = concat_tables(list(chunks))
+        np.savez(args.out, **table)
+        n = len(table['date'])
+    else:
+        with open(args.out, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(COLUMNS)
+            for table in chunks:
+                writer.writerows(zip(*(table[k].tolist() for k in COLUMNS)))
+                n += len(table['date'])
+    print(f'{n} setups -> {args.out}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,294 @@
+"""Load test: simulated dashboard clients against the app and a fake scraper.
+
+Starts a stand-in scraper (a subprocess of this script) with configurable
+latency and failure rate. It then starts the app under uvicorn, once per mode,
+and runs N clients that poll ``/api/scan`` the way the dashboard does: every
+``--interval`` seconds, each client starting at a random offset. Each mode
+reports:
+
+* throughput and latency percentiles (p50/p90/p99)
+* error counts
+* upstream amplification: scraper requests per client request
+* app RSS over time, summed over uvicorn and its workers
+
+A mode is ``backend[:workers][+ingest]``. ``backend`` is an
+``ORB_CACHE_BACKEND``; ``+ingest`` turns on background ingestion::
+
+    python loadtest.py --clients 200 --duration 60
+    python loadtest.py --clients 500 --modes memory:1,memory:4,file:4,shm:4+ingest
+    python loadtest.py --latency 0.8 --fail-rate 0.1 --json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def serve_scraper(port, latency, fail_rate):
+    # UDF-style {t,o,h,l,c} for any symbol/interval; /hits reports calls per path
+    hits = {}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            url = urllib.parse.urlsplit(self.path)
+            q = dict(urllib.parse.parse_qsl(url.query))
+            if url.path == '/hits':
+                return self.reply(200, json.dumps(hits).encode())
+            with lock:
+                hits[url.path] = hits.get(url.path, 0) + 1
+            time.sleep(random.uniform(latency / 2, latency * 1.5) if latency else 0)
+            if random.random() < fail_rate:
+                return self.reply(503, b'{"error":"injected failure"}')
+            if url.path == '/api/health':
+                return self.reply(200, b'{"status":"ok"}')
+            step = int(q.get('interval', q.get('resolution', '1'))) * 60
+            n = int(q.get('limit', q.get('bars_count', q.get('countback', 500))))
+            end = int(q.get('to', time.time())) // step * step
+            base = 100 + sum(map(ord, q.get('symbol', ''))) % 400
+            t = [end - step * (n - 1 - i) for i in range(n)]
+            c = [base + 5 * math.sin(x / 3000) + 3 * math.sin(x / 170) for x in t]
+            body = {'t': t, 'o': [x - 0.4 for x in c], 'h': [x + 1 for x in c], 'l': [x - 1 for x in c], 'c': c}
+            self.reply(200, json.dumps(body).encode())
+
+        def reply(self, status, body):
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    class Server(ThreadingHTTPServer):
+        request_queue_size = 256  # the default backlog of 5 refuses bursts
+
+    Server(('127.0.0.1', port), Handler).serve_forever()
+
+
+def upstream_calls(scraper_url):
+    with urllib.request.urlopen(f'{scraper_url}/hits', timeout=5) as resp:
+        return sum(json.load(resp).values())
+
+
+def rss_mb(pid):
+    # the process plus all of its descendants (uvicorn --workers forks)
+    pids, total = [pid], 0
+    while pids:
+        p = pids.pop()
+        try:
+            with open(f'/proc/{p}/status') as f:
+                total += next(int(line.split()[1]) for line in f if line.startswith('VmRSS:'))
+            for task in os.listdir(f'/proc/{p}/task'):
+                with open(f'/proc/{p}/task/{task}/children') as f:
+                    pids += [int(c) for c in f.read().split()]
+        except (FileNotFoundError, ProcessLookupError, StopIteration):
+            continue
+    return round(total / 1024, 1)
+
+
+def parse_mode(spec):
+    backend, _, ingest = spec.partition('+')
+    backend, _, workers = backend.partition(':')
+    return {'name': spec, 'backend': backend, 'workers': int(workers or 1), 'ingest': ingest == 'ingest'}
+
+
+def start_app(mode, port, scraper_url, workdir):
+    env = {
+        **os.environ, 'SCRAPER_URL': scraper_url, 'ORB_CACHE_BACKEND': mode['backend'],
+        'ORB_CACHE_DIR': os.path.join(workdir, 'cache'), 'ORB_JOURNAL': os.path.join(workdir, 'positions.jsonl'),
+        'ORB_SIGNALS': os.path.join(workdir, 'signals.db'), 'ORB_ALERT_LOG': os.path.join(workdir, 'alerts.jsonl'),
+        'ORB_ALERT_WEBHOOK': '', 'ORB_STORE_DIR': os.path.join(workdir, 'candles'),
+        'ORB_INGEST': 'background' if mode['ingest'] else 'on-demand',
+    }
+    os.makedirs(env['ORB_CACHE_DIR'], exist_ok=True)
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'api.index:app', '--port', str(port),
+         '--workers', str(mode['workers']), '--log-level', 'warning'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/api/metrics', timeout=1).close()
+            return proc
+        except OSError:
+            if proc.poll() is not None:
+                raise RuntimeError(f'app exited: {proc.stderr.read().decode().strip()[-500:]}')
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError('app did not come up within 30s')
+
+
+async def get(port, path, timeout):
+    # one request per connection, like independent browser tabs
+    reader, writer = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', port), timeout)
+    try:
+        writer.write(f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n\r\n'.encode())
+        await writer.drain()
+        raw = await asyncio.wait_for(reader.read(), timeout)
+    finally:
+        writer.close()
+    return int(raw.split(b' ', 2)[1])
+
+
+async def client(port, path, interval, until, timeout, samples):
+    await asyncio.sleep(random.uniform(0, interval))
+    while time.time() < until:
+        t0 = time.time()
+        try:
+            status = await get(port, path, timeout)
+        except (OSError, asyncio.TimeoutError, IndexError, ValueError):
+            status = 0
+        samples.append((t0, time.time() - t0, status))
+        await asyncio.sleep(max(0, interval - (time.time() - t0)))
+
+
+async def drive(args, port, app_pid, scraper_url):
+    samples, series = [], []
+    start = time.time()
+    until = start + args.duration
+    up0 = upstream_calls(scraper_url)
+    tasks = [asyncio.ensure_future(client(port, args.path, args.interval, until, args.timeout, samples))
+             for _ in range(args.clients)]
+    seen = 0
+    while time.time() < until:
+        await asyncio.sleep(args.sample)
+        window = samples[seen:]
+        seen = len(samples)
+        lat = sorted(s[1] for s in window)
+        series.append({
+            't': round(time.time() - start), 'requests': len(window),
+            'errors': sum(1 for s in window if s[2] != 200),
+            'p50_ms': pct(lat, 50), 'p99_ms': pct(lat, 99),
+            'upstream': upstream_calls(scraper_url) - up0, 'rss_mb': rss_mb(app_pid),
+        })
+    await asyncio.gather(*tasks)
+    return samples, series, upstream_calls(scraper_url) - up0
+
+
+def pct(sorted_values, p):
+    if not sorted_values:
+        return None
+    k = min(len(sorted_values) - 1, max(0, math.ceil(p / 100 * len(sorted_values)) - 1))
+    return round(sorted_values[k] * 1000, 1)
+
+
+def run_mode(args, mode, port, scraper_url):
+    with tempfile.TemporaryDirectory(prefix='orb-load-') as workdir:
+        proc = start_app(mode, port, scraper_url, workdir)
+        try:
+            rss0 = rss_mb(proc.pid)
+            samples, series, upstream = asyncio.run(drive(args, port, proc.pid, scraper_url))
+        finally:
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+    ok = sorted(s[1] for s in samples if s[2] == 200)
+    took = max(s[0] + s[1] for s in samples) - min(s[0] for s in samples) if samples else 0
+    return {
+        'mode': mode['name'], 'clients': args.clients, 'requests': len(samples),
+        'errors': len(samples) - len(ok),
+        'status': {str(k): v for k, v in sorted(_count(s[2] for s in samples).items())},
+        'rps': round(len(samples) / took, 1) if took else 0,
+        'p50_ms': pct(ok, 50), 'p90_ms': pct(ok, 90), 'p99_ms': pct(ok, 99),
+        'mean_ms': round(statistics.fmean(ok) * 1000, 1) if ok else None,
+        'upstream_calls': upstream,
+        'amplification': round(upstream / len(samples), 4) if samples else None,
+        'rss_start_mb': rss0, 'rss_peak_mb': max((s['rss_mb'] for s in series), default=rss0),
+        'rss_end_mb': series[-1]['rss_mb'] if series else rss0,
+        'series': series,
+    }
+
+
+def _count(values):
+    out = {}
+    for v in values:
+        out[v] = out.get(v, 0) + 1
+    return out
+
+
+def print_report(reports, verbose):
+    cols = ('mode', 'requests', 'errors', 'rps', 'p50_ms', 'p90_ms', 'p99_ms',
+            'upstream_calls', 'amplification', 'rss_start_mb', 'rss_peak_mb', 'rss_end_mb')
+    rows = [[str(r[c]) for c in cols] for r in reports]
+    widths = [max(len(c), *(len(row[i]) for row in rows)) for i, c in enumerate(cols)]
+    print('  '.join(c.rjust(w) for c, w in zip(cols, widths)))
+    for row in rows:
+        print('  '.join(v.rjust(w) for v, w in zip(row, widths)))
+    if verbose:
+        for r in reports:
+            print(f"\n{r['mode']} over time (status {r['status']}):")
+            print('     t  requests  errors  p50_ms  p99_ms  upstream  rss_mb')
+            for s in r['series']:
+                print(f"{s['t']:>6}  {s['requests']:>8}  {s['errors']:>6}  {str(s['p50_ms']):>6}  "
+                      f"{str(s['p99_ms']):>6}  {s['upstream']:>8}  {s['rss_mb']:>6}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--clients', type=int, default=100)
+    ap.add_argument('--interval', type=float, default=5.0, help='seconds between polls per client (dashboard: 5)')
+    ap.add_argument('--duration', type=float, default=30.0, help='seconds per mode')
+    ap.add_argument('--path', default='/api/scan')
+    ap.add_argument('--modes', default='memory:1', help='comma-separated backend[:workers][+ingest]')
+    ap.add_argument('--latency', type=float, default=0.3, help='mean scraper latency, seconds')
+    ap.add_argument('--fail-rate', type=float, default=0.0, help='fraction of scraper calls answered 503')
+    ap.add_argument('--timeout', type=float, default=30.0, help='client request timeout, seconds')
+    ap.add_argument('--sample', type=float, default=5.0, help='seconds per time-series sample')
+    ap.add_argument('--port', type=int, default=8790)
+    ap.add_argument('--scraper-port', type=int, default=8791)
+    ap.add_argument('--serve-scraper', action='store_true', help=argparse.SUPPRESS)
+    ap.add_argument('--json', action='store_true')
+    args = ap.parse_args()
+
+    if args.serve_scraper:
+        serve_scraper(args.scraper_port, args.latency, args.fail_rate)
+        return 0
+
+    scraper_url = f'http://127.0.0.1:{args.scraper_port}'
+    scraper = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), '--serve-scraper', '--scraper-port', str(args.scraper_port),
+         '--latency', str(args.latency), '--fail-rate', str(args.fail_rate)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    reports = []
+    try:
+        for _ in range(50):
+            try:
+                upstream_calls(scraper_url)
+                break
+            except OSError:
+                time.sleep(0.1)
+        for spec in args.modes.split(','):
+            mode = parse_mode(spec)
+            if not args.json:
+                print(f'{spec}: {args.clients} clients for {args.duration:.0f}s ...', file=sys.stderr, flush=True)
+            reports.append(run_mode(args, mode, args.port, scraper_url))
+    finally:
+        scraper.terminate()
+    if args.json:
+        print(json.dumps(reports, indent=1))
+    else:
+        print_report(reports, verbose=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,6 +1,23 @@
-import pandas as pd
+from datetime import date as _date, datetime
+
 from sklearn.base import BaseEstimator, ClassifierMixin
 
+SETUP_FIELDS = ('range_size', 'fvg_size', 'candles_to_break', 'direction', 'date')
+DAY_NAMES = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+
+
+def day_name(date):
+    # pandas is only imported for inputs the stdlib cannot parse
+    if isinstance(date, _date):
+        return DAY_NAMES[date.weekday()]
+    if isinstance(date, str):
+        try:
+            return DAY_NAMES[datetime.strptime(date[:10], '%Y-%m-%d').weekday()]
+        except ValueError:
+            pass
+    import pandas as pd
+    return pd.to_datetime(date).day_name()
+
 
 class ORBModel(BaseEstimator, ClassifierMixin):
     def __init__(self):
@@ -53,7 +70,7 @@ class ORBModel(BaseEstimator, ClassifierMixin):
             score += 1
             reasons.append("Medium FVG (7-15)")
 
-        day = pd.to_datetime(date).day_name()
+        day = day_name(date)
         if day == self.rules['best_day']:
             score += 3
             reasons.append("Tuesday (best day)")
@@ -82,6 +99,17 @@ class ORBModel(BaseEstimator, ClassifierMixin):
             "reasons": reasons
         }
 
+    def score_batch(self, setups):
+        # setups: list of dicts, or a dict of equal-length columns keyed by SETUP_FIELDS
+        if isinstance(setups, dict):
+            rows = zip(*(setups[k] for k in SETUP_FIELDS))
+        else:
+            rows = ((s[k] for k in SETUP_FIELDS) for s in setups)
+        return [self.score_trade(*row) for row in rows]
+
+    def predict(self, X):
+        return [s['take_trade'] for s in self.score_batch(X)]
+
     def detect_opening_range(self, candles_1min):
         opening = [c for c in candles_1min if 930 <= int(c['time'].replace(':', '')) <= 944]
         if len(opening) == 0:
@@ -128,7 +156,7 @@ class ORBModel(BaseEstimator, ClassifierMixin):
                         "direction": "LONG",
                         "entry": fvg['entry'],
                         "stop": orb['range_low'],
-                        "target": fvg['entry'] + (fvg['entry'] - orb['range_low']),
+                        "target": fvg['entry'] + self.rules['target_rr'] * (fvg['entry'] - orb['range_low']),
                         "range_high": orb['range_high'],
                         "range_low": orb['range_low'],
                         "range_size": round(orb['range_size'], 2),
@@ -147,7 +175,7 @@ class ORBModel(BaseEstimator, ClassifierMixin):
                         "direction": "SHORT",
                         "entry": fvg['entry'],
                         "stop": orb['range_high'],
-                        "target": fvg['entry'] - (orb['range_high'] - fvg['entry']),
+                        "target": fvg['entry'] - self.rules['target_rr'] * (orb['range_high'] - fvg['entry']),
                         "range_high": orb['range_high'],
                         "range_low": orb['range_low'],
                         "range_size": round(orb['range_size'], 2),
@@ -157,4 +185,161 @@ class ORBModel(BaseEstimator, ClassifierMixin):
                         "prediction": prediction
                     }
 
-        return {"signal": False, "reason": "No valid breakout + FVG found"}
\ No newline at end of file
+        return {"signal": False, "reason": "No valid breakout + FVG found"}
+
+def encode_setups(setups):
+    """Feature matrix for a columnar setup table (or list of setup dicts)."""
+    import numpy as np
+    if not isinstance(setups, dict):
+        setups = {k: [s[k] for s in setups] for k in SETUP_FIELDS}
+    lr = np.log1p(np.abs(np.asarray(setups['range_size'], dtype=np.float64)))
+    lf = np.log1p(np.abs(np.asarray(setups['fvg_size'], dtype=np.float64)))
+    ls = np.log1p(np.asarray(setups['candles_to_break'], dtype=np.float64))
+    is_long = np.asarray(setups['direction']) == 'LONG'
+    dates = np.asarray(setups['date'])
+    try:
+        # 1970-01-01 was a Thursday
+        weekday = (np.asarray(dates, dtype='datetime64[D]').astype(np.int64) + 3) % 7
+    except (ValueError, TypeError):
+        weekday = np.array([DAY_NAMES.index(day_name(d)) for d in dates], dtype=np.int64)
+    X = np.zeros((len(lr), 6 + 1 + 7))
+    X[:, 0], X[:, 1], X[:, 2] = lr, lf, ls
+    X[:, 3], X[:, 4], X[:, 5] = lr * lr, lf * lf, ls * ls
+    X[:, 6] = is_long
+    X[np.arange(len(lr)), 7 + weekday] = 1.0
+    return X
+
+
+def setup_labels(setups):
+    """1 for setups that hit target, 0 for stops; -1 for rows without a resolved trade."""
+    import numpy as np
+    outcome = np.asarray(setups['outcome'])
+    return np.where(outcome == 'target', 1, np.where(outcome == 'stop', 0, -1))
+
+
+class ORBLearnedModel(ORBModel):
+    """ORBModel whose score is a logistic model trained out-of-core.
+
+    ``partial_fit`` takes one setup table at a time (the chunks ``features.iter_setups``
+    yields), so training never holds more than a chunk in memory. ``score_trade`` and
+    ``score_batch`` keep ORBModel's result shape: ``score`` is the win probability on
+    the rule table's 0-12 scale and ``take_trade`` is ``p >= threshold``.
+    """
+
+    version = 'v2'
+
+    def __init__(self, alpha=1e-3, threshold=0.55, random_state=0):
+        super().__init__()
+        self.alpha = alpha
+        self.threshold = threshold
+        self.random_state = random_state
+
+    def _clf(self):
+        if not hasattr(self, 'clf_'):
+            from sklearn.linear_model import SGDClassifier
+            from sklearn.preprocessing import StandardScaler
+            self.clf_ = SGDClassifier(loss='log_loss', alpha=self.alpha, average=True, random_state=self.random_state)
+            self.scaler_ = StandardScaler()
+            self.n_seen_ = 0
+        return self.clf_
+
+    def partial_fit(self, setups, y=None):
+        y = setup_labels(setups) if y is None else y
+        keep = y >= 0
+        if keep.any():
+            clf, X = self._clf(), encode_setups(setups)[keep]
+            # running mean/variance, so every chunk is scaled with the statistics seen so far
+            self.scaler_.partial_fit(X)
+            clf.partial_fit(self.scaler_.transform(X), y[keep], classes=[0, 1])
+            self.n_seen_ += int(keep.sum())
+        return self
+
+    def fit(self, tables, y=None, epochs=1):
+        # tables: iterable of setup tables, or a zero-argument callable returning one per epoch
+        for _ in range(epochs):
+            for table in (tables() if callable(tables) else tables):
+                self.partial_fit(table)
+        return self
+
+    def predict_proba(self, setups):
+        import numpy as np
+        # the scaler folded into the linear weights: one matvec, no sklearn input validation
+        scale = self.scaler_.scale_
+        w = self.clf_.coef_[0] / scale
+        b = self.clf_.intercept_[0] - w @ self.scaler_.mean_
+        p = 1.0 / (1.0 + np.exp(-(encode_setups(setups) @ w + b)))
+        return np.column_stack([1 - p, p])
+
+    def predict(self, setups):
+        return self.predict_proba(setups)[:, 1] >= self.threshold
+
+    def score_batch(self, setups):
+        p = self.predict_proba(setups)[:, 1]
+        return [self._result(float(x)) for x in p]
+
+    def score_trade(self, range_size, fvg_size, candles_to_break, direction, date):
+        return self.score_batch([dict(zip(SETUP_FIELDS, (range_size, fvg_size, candles_to_break, direction, date)))])[0]
+
+    def _result(self, p):
+        if p >= max(0.6, self.threshold):
+            confidence = "HIGH"
+        elif p >= self.threshold:
+            confidence = "MEDIUM"
+        else:
+            confidence = "LOW"
+        return {
+            "score": round(p * 12, 1),
+            "take_trade": p >= self.threshold,
+            "confidence": confidence,
+            "reasons": [f"Model {self.version} p(target)={p:.2f}"]
+        }
+
+    def save(self, path=None):
+        import joblib
+        path = path or f'orb_model_{self.version}.joblib'
+        joblib.dump(self, path)
+        return path
+
+
+def _cv_fold(model, make_tables, fold, n_splits):
+    import zlib
+
+    import numpy as np
+    fold_of = lambda dates: np.array([zlib.crc32(str(d).encode()) % n_splits for d in dates])
+    for table in make_tables():
+        train = fold_of(table['date']) != fold
+        model.partial_fit({k: np.asarray(v)[train] for k, v in table.items()})
+    y_true, p = [], []
+    # a short history can leave a fold with nothing to train on or nothing to test
+    trained = hasattr(model, 'clf_')
+    for table in make_tables():
+        test = fold_of(table['date']) == fold
+        y = setup_labels(table)[test]
+        keep = y >= 0
+        if keep.any() and trained:
+            y_true.append(y[keep])
+            p.append(model.predict_proba({k: np.asarray(v)[test][keep] for k, v in table.items()})[:, 1])
+    if not y_true:
+        return {'fold': fold, 'rows': 0, 'log_loss': None, 'accuracy': None, 'base_rate': None}
+    y_true, p = np.concatenate(y_true), np.concatenate(p)
+    eps = 1e-12
+    return {
+        'fold': fold,
+        'rows': int(len(y_true)),
+        'log_loss': float(-np.mean(y_true * np.log(p + eps) + (1 - y_true) * np.log(1 - p + eps))),
+        'accuracy': float(np.mean((p >= model.threshold) == y_true)),
+        'base_rate': float(y_true.mean()),
+    }
+
+
+def cross_validate(model, make_tables, n_splits=5, n_jobs=-1):
+    """K-fold CV with one process per fold; sessions are split by date so a day never straddles folds.
+
+    ``make_tables`` is a picklable zero-argument callable returning a fresh iterable of
+    setup tables, e.g. ``functools.partial(features.iter_setups, assets, since, until)``.
+    """
+    from joblib import Parallel, delayed
+    from sklearn.base import clone
+    return Parallel(n_jobs=n_jobs)(
+        delayed(_cv_fold)(clone(model), make_tables, k, n_splits) for k in range(n_splits)
+    )
@@ -0,0 +1,60 @@
+import sys
+
+import numpy as np
+
+import backfill
+from api.index import CONFIGS, EMPTY_CANDLES, Candles, CandleStore, candle_dtype
+
+DAY = 86400
+SINCE = '2025-01-01'
+T0 = 1735689600  # 2025-01-01 UTC
+
+
+def scraper(calls, fail_after=None):
+    # 15m bars from T0 on, paged backwards like the real ?to= bound
+    def fetch(symbol, interval, limit, end=None):
+        calls.append(end)
+        if fail_after is not None and len(calls) > fail_after:
+            raise ConnectionError('interrupted')
+        t = np.arange(T0, end + 1, 900)[-limit:]
+        if not len(t):
+            return EMPTY_CANDLES, None
+        rec = np.zeros(len(t), dtype=candle_dtype())
+        rec['t'] = t
+        rec['open'] = rec['high'] = rec['low'] = rec['close'] = 100.0
+        return Candles(rec), None
+    return fetch
+
+
+def run(monkeypatch, store, until, fetch):
+    monkeypatch.setattr(backfill, 'fetch_candles', fetch)
+    monkeypatch.setattr(sys, 'argv', ['backfill.py', '--since', SINCE, '--until', until, '--assets', 'NAS100',
+                                      '--intervals', '15', '--workers', '1', '--rate', '1000', '--store', store])
+    return backfill.main()
+
+
+def test_segments_do_not_move_with_until():
+    a = list(backfill.segments(T0, T0 + 200 * DAY, '15'))
+    b = list(backfill.segments(T0, T0 + 200 * DAY + 60, '15'))
+    assert [s[0] for s in a] == [s[0] for s in b]
+    assert a[0][1] == T0 and a[-1][2] == T0 + 200 * DAY
+
+
+def test_resume_with_later_until(monkeypatch, tmp_path):
+    monkeypatch.setattr(backfill, 'PAGE', 1000)
+    store = str(tmp_path)
+    full = []
+    run(monkeypatch, str(tmp_path / 'ref'), '2025-07-02', scraper(full))
+
+    first = []
+    assert run(monkeypatch, store, '2025-07-01', scraper(first, fail_after=len(full) // 2)) == 1
+    rest = []
+    assert run(monkeypatch, store, '2025-07-02', scraper(rest)) == 0
+    # the pages the interrupted run got are not fetched again
+    assert len(first) - 1 + len(rest) <= len(full) + 2
+    later = []
+    assert run(monkeypatch, store, '2025-07-03', scraper(later)) == 0
+    # a finished run extended by a day only pages that day
+    assert len(later) == 1 and later[0] == T0 + 183 * DAY - 1
+    bars = CandleStore(store).read(CONFIGS['NAS100']['symbol'], '15')
+    assert np.array_equal(bars.t, np.arange(T0, T0 + 183 * DAY, 900))
@@ -0,0 +1,34 @@
+from datetime import datetime
+
+import pytz
+
+from api.index import api_scan_batch, scan_job
+
+ET = pytz.timezone('US/Eastern')
+
+
+def job(asset):
+    # 99-101 range, LONG breakout FVG at 09:47, bars on to the 16:00 close
+    bars = []
+    for m in range(9 * 60 + 30, 16 * 60):
+        t = int(ET.localize(datetime(2026, 10, 14, m // 60, m % 60)).timestamp())
+        if m == 9 * 60 + 46:
+            bars.append([t, 100.6, 103.2, 100.5, 103])
+        elif m == 9 * 60 + 47:
+            bars.append([t, 103, 104, 102, 103.5])
+        else:
+            bars.append([t, 100, 101, 99, 100] if m < 9 * 60 + 46 else [t, 103, 103.5, 102.5, 103])
+    return {'asset': asset, 'date': '2026-10-14', 'ma50': 2.0, 'ma200': 1.0,
+            'candles': {k: [b[i] for b in bars] for i, k in enumerate('tohlc')}}
+
+
+def test_jobs_must_be_objects():
+    assert api_scan_batch({'jobs': [job('GOLD'), 1]}).status_code == 400
+
+
+def test_setups_are_scored_in_their_own_window():
+    # evaluated as of GOLD's 16:00 close, inside the "16:00 ET" window; the setup formed at 09:47
+    r = scan_job(job('GOLD'))
+    assert r['direction'] == 'LONG'
+    assert any('09:00 ET window' in x for x in r['reasons'])
+    assert not any('16:00 ET' in x for x in r['reasons'])
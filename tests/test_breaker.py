@@ -0,0 +1,58 @@
+import pytest
+
+import api.index as m
+from api.index import CircuitBreaker, CircuitOpen
+
+
+def expire(b):
+    b.open_until = 0
+
+
+def test_trips_after_threshold_and_fails_fast():
+    b = CircuitBreaker('h', threshold=3, base=5)
+    for _ in range(2):
+        b.failure()
+    assert b.state == 'CLOSED' and b.allow()
+    b.failure()
+    assert b.state == 'OPEN' and not b.allow()
+    assert 2.5 <= b.retry_in() <= 5
+
+
+def test_half_open_lets_one_probe_through():
+    b = CircuitBreaker('h', threshold=1, base=5)
+    b.failure()
+    expire(b)
+    assert b.allow() and b.state == 'HALF_OPEN'
+    assert not b.allow()
+    b.success()
+    assert b.state == 'CLOSED' and b.trips == 0 and b.allow()
+
+
+def test_failed_probe_reopens_with_a_longer_delay():
+    b = CircuitBreaker('h', threshold=1, base=5, cap=12)
+    b.failure()
+    for trips, hi in ((2, 10), (3, 12), (4, 12)):
+        expire(b)
+        assert b.allow()
+        b.failure()
+        assert b.state == 'OPEN' and b.trips == trips
+        assert hi / 2 <= b.retry_in() <= hi
+
+
+def test_open_circuit_short_circuits_the_scraper(monkeypatch):
+    calls = []
+
+    def urlopen(req, **kwargs):
+        calls.append(req.full_url)
+        raise OSError('down')
+
+    monkeypatch.setattr(m, 'BREAKERS', {})
+    monkeypatch.setattr(m.urlrequest, 'urlopen', urlopen)
+    urls = [f'http://scraper.test/{i}' for i in range(5)]
+    for _ in range(3):
+        assert m.get_first(urls[:1])[0] is None
+    data, err = m.get_first(urls)
+    assert data is None and 'circuit open' in err
+    assert len(calls) == 3
+    with pytest.raises(CircuitOpen):
+        m.http_get(urls[0])
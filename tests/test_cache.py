@@ -0,0 +1,51 @@
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+import api.index as m
+from api.index import FileCache, scrape_result
+
+
+def slow_scrape(log):
+    def scrape(asset):
+        with open(log, 'a') as f:
+            f.write(f'{os.getpid()}\n')
+        time.sleep(0.5)
+        return m.store_scrape(asset, scrape_result(asset, error='test'))
+    return scrape
+
+
+def worker(start, out):
+    # a separate process with its own memory, sharing only the cache directory
+    while time.time() < start:
+        time.sleep(0.005)
+    out.put(m.scrape_asset('NAS100')['error'])
+
+
+def test_workers_share_one_scrape(monkeypatch, tmp_path):
+    log = str(tmp_path / 'scrapes')
+    monkeypatch.setattr(m, 'CACHE', FileCache(str(tmp_path / 'cache')))
+    monkeypatch.setattr(m, '_scrape_asset', slow_scrape(log))
+    ctx = multiprocessing.get_context('fork')
+    out = ctx.Queue()
+    start = time.time() + 0.3
+    procs = [ctx.Process(target=worker, args=(start, out)) for _ in range(4)]
+    for p in procs:
+        p.start()
+    results = [out.get(timeout=10) for _ in procs]
+    for p in procs:
+        p.join(10)
+    assert results == ['test'] * 4
+    assert len(open(log).read().split()) == 1
+
+
+def test_arrays_round_trip_as_views(tmp_path):
+    cache = FileCache(str(tmp_path))
+    a = np.arange(1000, dtype='<f8')
+    cache.set('k', {'a': a, 'n': 1})
+    got = cache.get('k')
+    assert got['n'] == 1 and np.array_equal(got['a'], a)
+    assert not got['a'].flags.owndata
+    assert cache.get('k', ttl=0) is None
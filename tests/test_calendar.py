@@ -0,0 +1,48 @@
+from datetime import datetime
+
+import pytz
+
+from api.index import get_session_progress, get_session_state
+
+ET = pytz.timezone('US/Eastern')
+
+
+def at(y, mo, d, hh, mm, tz=ET):
+    return tz.localize(datetime(y, mo, d, hh, mm)).astimezone(pytz.UTC)
+
+
+def state(asset, when):
+    return get_session_state(asset, when)[0]
+
+
+def test_dst_mondays_open_at_930_eastern():
+    # 2026-03-09 and 2026-11-02 follow the spring-forward and fall-back weekends
+    for day in ((2026, 3, 9), (2026, 11, 2)):
+        assert state('NAS100', at(*day, 9, 29)) == 'PRE_MARKET'
+        assert state('NAS100', at(*day, 9, 30)) == 'FORMING'
+        assert state('NAS100', at(*day, 9, 45)) == 'OPEN'
+        assert state('NAS100', at(*day, 16, 0)) == 'OPEN'              # the close minute still trades
+        assert state('NAS100', at(*day, 16, 1)) == 'POST_MARKET'
+    assert at(2026, 3, 9, 9, 30).hour == 13 and at(2026, 11, 2, 9, 30).hour == 14
+
+
+def test_thanksgiving_and_the_early_close():
+    assert get_session_state('NAS100', at(2026, 11, 26, 10, 0)) == ('HOLIDAY', 'Markets closed — Thanksgiving Day')
+    # GOLD keeps its session without the NYSE calendar
+    assert state('GOLD', at(2026, 11, 26, 10, 0)) == 'OPEN'
+    assert state('NAS100', at(2026, 11, 27, 13, 0)) == 'OPEN'
+    assert state('NAS100', at(2026, 11, 27, 13, 1)) == 'POST_MARKET'
+    assert get_session_progress('NAS100', at(2026, 11, 27, 13, 0)) == 100
+
+
+def test_weekends():
+    assert state('NAS100', at(2026, 10, 17, 11, 0)) == 'WEEKEND'
+    assert state('GOLD', at(2026, 10, 18, 11, 0)) == 'WEEKEND'
+
+
+def test_btc_trades_all_day_every_day():
+    utc = pytz.UTC
+    assert get_session_state('BTCUSD', at(2026, 10, 17, 0, 5, utc)) == ('FORMING', 'Daily range forming')
+    for hh, mm in ((0, 15), (12, 0), (23, 59)):
+        assert state('BTCUSD', at(2026, 10, 17, hh, mm, utc)) == 'OPEN'
+    assert get_session_progress('BTCUSD', at(2026, 10, 17, 12, 0, utc)) == 50
@@ -0,0 +1,36 @@
+from datetime import datetime
+
+import numpy as np
+import pytz
+
+from api.index import Candles, candle_dtype
+from features import session_setups
+
+ET = pytz.timezone('US/Eastern')
+
+
+def session(day, breakout_hhmm, close_hhmm=1700):
+    # flat 99-101 range, then a single LONG breakout FVG at breakout_hhmm
+    rows, hm = [], 930
+    while hm < close_hhmm:
+        t = int(ET.localize(datetime(*day, hm // 100, hm % 100)).timestamp())
+        if hm == breakout_hhmm:
+            rows.append((t, 100.6, 103.2, 100.5, 103))
+        elif rows and rows[-1][4] == 103 and rows[-1][1] == 100.6:
+            rows.append((t, 103, 104, 102, 103.5))       # low above the pre-breakout high: FVG
+        else:
+            rows.append((t, 100, 101, 99, 100))
+        hm = hm + 1 if hm % 100 < 59 else hm + 41
+    return Candles(np.array(rows, dtype=candle_dtype()))
+
+
+def test_setups_stop_at_the_session_close():
+    assert len(session_setups('NAS100', '2026-10-14', session((2026, 10, 14), 1500), 2.0, 1.0)) == 1
+    assert session_setups('NAS100', '2026-10-14', session((2026, 10, 14), 1610), 2.0, 1.0) == []
+
+
+def test_holidays_have_no_setups():
+    # Thanksgiving: NYSE closed, GOLD trades
+    bars = session((2026, 11, 26), 1500)
+    assert session_setups('NAS100', '2026-11-26', bars, 2.0, 1.0) == []
+    assert len(session_setups('GOLD', '2026-11-26', bars, 2.0, 1.0)) == 1
@@ -0,0 +1,78 @@
+import asyncio
+import gzip
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from api.index import BREAKERS, ahttp_get
+
+BODY = json.dumps({'t': [1, 2, 3]}).encode()
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    peers = []
+
+    def do_GET(self):
+        self.peers.append(self.client_address)
+        if self.path == '/moved':
+            return self.reply(302, b'', Location='/plain')
+        if self.path == '/gone':
+            return self.reply(404, b'')
+        if self.path == '/gzip':
+            return self.reply(200, gzip.compress(BODY), **{'Content-Encoding': 'gzip'})
+        if self.path == '/chunked':
+            self.send_response(200)
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            for part in (BODY[:5], BODY[5:]):
+                self.wfile.write(b'%x\r\n%s\r\n' % (len(part), part))
+            self.wfile.write(b'0\r\n\r\n')
+            return
+        self.reply(200, BODY)
+
+    def reply(self, status, body, **headers):
+        self.send_response(status)
+        for k, v in {'Content-Length': str(len(body)), **headers}.items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope='module')
+def server():
+    srv = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{srv.server_address[1]}'
+    srv.shutdown()
+
+
+@pytest.fixture
+def base(server):
+    Handler.peers = []
+    yield server
+    BREAKERS.clear()
+
+
+@pytest.mark.parametrize('path', ['/plain', '/moved', '/gzip', '/chunked'])
+def test_bodies(base, path):
+    assert asyncio.run(ahttp_get(base + path)) == {'t': [1, 2, 3]}
+
+
+def test_keep_alive_reuses_the_connection(base):
+    async def twice():
+        return [await ahttp_get(base + '/plain') for _ in range(2)]
+    assert asyncio.run(twice())[1] == {'t': [1, 2, 3]}
+    assert len(Handler.peers) == 2 and Handler.peers[0] == Handler.peers[1]
+
+
+def test_client_errors_do_not_trip_the_breaker(base):
+    for _ in range(5):
+        with pytest.raises(Exception, match='HTTP Error 404'):
+            asyncio.run(ahttp_get(base + '/gone'))
+    assert BREAKERS[base[7:]].state == 'CLOSED'
@@ -0,0 +1,31 @@
+import numpy as np
+
+import api.index as m
+from api.index import Candles, CandleStore, candle_dtype, scrape_result
+
+NOW = 1791985800  # 2026-10-14 09:50 ET, a bar close
+
+
+def bars(step, n, skip=()):
+    t = np.array([NOW - step * k for k in range(n, 0, -1)] + [NOW])    # last bar still forming
+    rec = np.zeros(len(t), dtype=candle_dtype())
+    rec['t'] = t
+    rec['open'] = rec['high'] = rec['low'] = rec['close'] = 100.0
+    return Candles(rec[~np.isin(rec['t'], list(skip))])
+
+
+def test_refreshed_bars_reach_the_candle_store(monkeypatch, tmp_path):
+    store = CandleStore(str(tmp_path))
+    monkeypatch.setattr(m, 'STORE', store)
+    monkeypatch.setattr(m, '_persisted', {})
+    gap = NOW - 60 * 30
+    scraped = scrape_result('NAS100', bars(900, 299), None, bars(60, 499, skip={gap}))
+    assert scraped['status'] == 'OK' and gap in scraped['quality']['filled_t'].tolist()
+    m.persist('NAS100', scraped, NOW)
+    symbol = m.CONFIGS['NAS100']['symbol']
+    t1, t15 = store.read(symbol, '1').t, store.read(symbol, '15').t
+    assert len(t1) == 498 and gap not in t1 and t1[-1] == NOW - 60
+    assert len(t15) == 299 and t15[-1] == NOW - 900
+    # within STORE_FLUSH of the last write nothing is rewritten
+    m.persist('NAS100', scrape_result('NAS100', bars(900, 299), None, bars(60, 499)), NOW + 60)
+    assert len(store.read(symbol, '1')) == 498
@@ -0,0 +1,38 @@
+import os
+import shutil
+
+import pytest
+from fastapi.testclient import TestClient
+
+import api.index as m
+
+V1 = os.path.join(m.ROOT, 'orb_model_v1.joblib')
+
+
+@pytest.fixture
+def models(monkeypatch, tmp_path):
+    for v in ('v1', 'v2'):
+        shutil.copy(V1, tmp_path / f'orb_model_{v}.joblib')
+    monkeypatch.setattr(m, 'MODEL_DIR', str(tmp_path))
+    monkeypatch.setattr(m, 'MODEL_POLL', 0)
+    shared = str(tmp_path / 'active')
+    monkeypatch.setattr(m, 'MODELS', m.ModelRegistry('v1', shared))
+    return shared
+
+
+def test_activation_reaches_other_processes(models):
+    other = m.ModelRegistry('v1', models)
+    other.get()
+    m.MODELS.activate('v2', publish=True)
+    other.get()
+    assert other.version == 'v2' and other.active[0] == 'v2'
+
+
+def test_activation_needs_the_admin_token(models, monkeypatch):
+    client = TestClient(m.app)
+    assert client.post('/api/model', json={'version': 'v2'}).status_code == 403
+    monkeypatch.setattr(m, 'ADMIN_TOKEN', 'secret')
+    assert client.post('/api/model', json={'version': 'v2'}).status_code == 401
+    r = client.post('/api/model', json={'version': 'v2'}, headers={'Authorization': 'Bearer secret'})
+    assert r.status_code == 200 and r.json()['version'] == 'v2'
+    assert open(models).read() == 'v2'
@@ -0,0 +1,36 @@
+import numpy as np
+
+from orb_model import ORBLearnedModel, cross_validate, setup_labels
+
+
+def table(dates, outcomes):
+    n = len(dates)
+    return {
+        'date': np.array(dates),
+        'direction': np.array(['LONG', 'SHORT'] * (n // 2) + ['LONG'] * (n % 2)),
+        'range_size': np.linspace(10, 60, n),
+        'fvg_size': np.linspace(1, 8, n),
+        'candles_to_break': np.arange(1, n + 1),
+        'outcome': np.array(outcomes),
+    }
+
+
+def test_setup_labels_marks_unresolved_rows():
+    labels = setup_labels(table(['2025-01-06'] * 4, ['target', 'stop', 'open', 'unfilled']))
+    assert labels.tolist() == [1, 0, -1, -1]
+
+
+def test_cross_validate_skips_folds_without_rows():
+    # one session date: a single fold holds every row, the others have nothing to test
+    t = table(['2025-01-06'] * 6, ['target', 'stop'] * 3)
+    folds = cross_validate(ORBLearnedModel(), lambda: [t], n_splits=3, n_jobs=1)
+    assert len(folds) == 3
+    assert all(f['rows'] == 0 and f['log_loss'] is None for f in folds)
+
+
+def test_cross_validate_scores_folds_with_rows():
+    dates = [f'2025-01-{d:02d}' for d in range(1, 29)] * 2
+    t = table(dates, ['target', 'stop', 'stop', 'target'] * 14)
+    folds = cross_validate(ORBLearnedModel(), lambda: [t], n_splits=2, n_jobs=1)
+    assert sum(f['rows'] for f in folds) == len(dates)
+    assert all(0 <= f['accuracy'] <= 1 for f in folds if f['rows'])
@@ -0,0 +1,35 @@
+from datetime import datetime
+
+import numpy as np
+import pytz
+
+from api.index import Candles, PositionTracker, candle_dtype
+
+ET = pytz.timezone('US/Eastern')
+
+
+def bar(mm, o, h, l, c):
+    return (int(ET.localize(datetime(2026, 10, 14, 9, mm)).timestamp()), o, h, l, c)
+
+
+BARS = Candles(np.array([
+    bar(50, 101, 101.2, 100.8, 101),        # setup bar
+    bar(51, 101, 104, 100.5, 103),          # runs up before the entry fills
+    bar(52, 100.3, 100.3, 99.9, 100.2),     # fills at 100
+    bar(53, 100.2, 100.8, 100, 100.5),
+], dtype=candle_dtype()))
+TRADE = {'status': 'TRADE', 'setup_t': int(BARS.t[0]), 'direction': 'LONG', 'entry': 100.0, 'stop': 98.0,
+         'target': 104.5, 'score': 3, 'confidence': 'HIGH'}
+NOW = int(BARS.t[-1]) + 60
+
+
+def test_replayed_journal_keeps_excursions(tmp_path):
+    path = str(tmp_path / 'positions.jsonl')
+    live = PositionTracker(path)
+    live.observe('NAS100', TRADE, BARS, now=NOW)
+    [pos] = live.snapshot()['open']
+    assert pos['state'] == 'filled' and pos['mfe'] == 0.8
+
+    replayed = PositionTracker(path)
+    replayed.observe('NAS100', {'status': 'SCANNING'}, BARS, now=NOW)
+    assert replayed.snapshot()['open'] == [pos]
@@ -0,0 +1,73 @@
+from datetime import datetime
+
+import numpy as np
+import pytz
+
+from api.index import Candles, candle_dtype, check_candles, run_scan
+
+ET = pytz.timezone('US/Eastern')
+NOW = ET.localize(datetime(2026, 10, 14, 10, 30)).astimezone(pytz.UTC)
+
+
+def bar(hh, mm, o, h, l, c):
+    return (int(ET.localize(datetime(2026, 10, 14, hh, mm)).timestamp()), o, h, l, c)
+
+
+def session(skip=()):
+    rows = [bar(9, m, 100, 100.5, 99.5, 100) for m in range(0, 30)]
+    rows += [bar(9, m, 100, 101, 99, 100) for m in range(30, 45)]         # range 99-101
+    rows += [bar(9, 45, 100, 100.8, 99.8, 100.5),
+             bar(9, 46, 100.6, 103.2, 100.5, 103),                        # breakout bar
+             bar(9, 47, 103, 103.1, 100.6, 101.5)]                        # overlaps: no FVG
+    rows += [bar(9 + (m // 60), m % 60, 102, 102.5, 101.5, 102) for m in range(48, 90)]
+    rows = [r for r in rows if r[0] not in skip]
+    return Candles(np.array(rows, dtype=candle_dtype()))
+
+
+def scan(candles, report):
+    scraped = {'status': 'OK', 'candles': candles, 'quality': report, 'ma50': 2.0, 'ma200': 1.0,
+               'price': float(candles.close[-1])}
+    return run_scan('NAS100', scraped, NOW)
+
+
+def test_no_fvg_on_complete_bars():
+    candles, report = check_candles(session())
+    assert scan(candles, report)['status'] == 'SCANNING'
+
+
+def test_gap_after_breakout_does_not_signal():
+    gap = bar(9, 47, 0, 0, 0, 0)[0]
+    candles, report = check_candles(session(skip={gap}))
+    assert gap in report['filled_t'].tolist()
+    # the filled 09:47 bar is flat at 103, above the 09:45 high: an FVG if it counted
+    assert scan(candles, None)['status'] in ('TRADE', 'SKIP')
+    r = scan(candles, report)
+    assert r['status'] == 'SCANNING'
+    assert 'entry' not in r
+
+
+def test_incomplete_range_is_not_traded():
+    gaps = {bar(9, m, 0, 0, 0, 0)[0] for m in range(33, 39)}
+    candles, report = check_candles(session(skip=gaps))
+    r = scan(candles, report)
+    assert r['status'] == 'NO_TRADE'
+    assert r['quality']['range_bars'] == 9
+
+
+def test_variants_apply_the_coverage_gate():
+    # 09:32 missing: 14/15 bars is enough for the 15m range, 4/5 is not for the 5m one
+    candles, report = check_candles(session(skip={bar(9, 32, 0, 0, 0, 0)[0]}))
+    scraped = {'status': 'OK', 'candles': candles, 'quality': report, 'ma50': 2.0, 'ma200': 1.0,
+               'price': float(candles.close[-1])}
+    r = run_scan('NAS100', scraped, NOW, variants=True)
+    status = {v['range']: v['status'] for v in r['variants']}
+    assert status['5m'] == 'NO_TRADE'
+    assert status['15m'] == r['status'] == 'SCANNING'
+    # BTCUSD's session clock is UTC: at 00:08 ET its ranges are still forming on the ET clock
+    now = ET.localize(datetime(2026, 10, 14, 0, 8)).astimezone(pytz.UTC)
+    rows = [(int(now.timestamp()) - 60 * k, 100, 101, 99, 100) for k in range(60, 0, -1)]
+    btc = Candles(np.array(rows, dtype=candle_dtype()))
+    scraped = {'status': 'OK', 'candles': btc, 'quality': None, 'ma50': 2.0, 'ma200': 1.0, 'price': 100.0}
+    r = run_scan('BTCUSD', scraped, now, variants=True)
+    status = {v['range']: v['status'] for v in r['variants']}
+    assert r['status'] == status['15m'] == status['30m'] == 'FORMING'
@@ -0,0 +1,59 @@
+from datetime import date, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+import api.index as m
+from api.index import SignalStore
+
+ASSETS = ('BTCUSD', 'GOLD', 'NAS100')
+DAYS = [str(date(2026, 9, 1) + timedelta(days=n)) for n in range(10)]
+
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    s = SignalStore(str(tmp_path / 'signals.db'))
+    for day in DAYS:
+        for asset in ASSETS:
+            s.record(asset, {'status': 'SCANNING', 'session_date': day})
+            s.record(asset, {'status': 'TRADE', 'direction': 'LONG', 'setup_t': 1, 'session_date': day})
+    s.flush()
+    monkeypatch.setattr(m, 'SIGNALS', s)
+    yield s
+    s.close()
+
+
+def pages(client, **params):
+    out, cursor = [], None
+    while True:
+        r = client.get('/api/signals', params={**params, **({'cursor': cursor} if cursor else {})}).json()
+        out.append(r['signals'])
+        cursor = r['next_cursor']
+        if not cursor:
+            return out
+
+
+def test_signal_pages_cover_every_row_once(store):
+    client = TestClient(m.app)
+    got = pages(client, limit=7)
+    assert [len(p) for p in got] == [7, 7, 7, 7, 2]
+    keys = [(r['session_date'], r['asset']) for p in got for r in p]
+    assert keys == sorted({(d, a) for d in DAYS for a in ASSETS}, reverse=True)
+    assert all(r['status'] == 'TRADE' for p in got for r in p)
+
+
+def test_transition_pages_and_filters(store):
+    client = TestClient(m.app)
+    got = pages(client, transitions='true', asset='gold', since=DAYS[2], until=DAYS[5], limit=3)
+    rows = [r for p in got for r in p]
+    assert len(rows) == 8 and {r['asset'] for r in rows} == {'GOLD'}
+    ids = [r['id'] for r in rows]
+    assert ids == sorted(ids, reverse=True)
+    assert [r['prev_status'] for r in rows[:2]] == ['SCANNING', None]
+
+
+def test_bad_queries(store):
+    client = TestClient(m.app)
+    assert client.get('/api/signals', params={'status': 'MAYBE'}).status_code == 400
+    assert client.get('/api/signals', params={'asset': 'DOGE'}).status_code == 404
+    assert client.get('/api/signals', params={'transitions': 'true', 'cursor': 'x'}).status_code == 400